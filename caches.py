@@ -0,0 +1,163 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class FilterCache:
+    # Process-wide LRU of filter results (row-position arrays), bounded by the
+    # total bytes held rather than the entry count.
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            positions = self.entries.get(key)
+            if positions is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return positions
+
+    def put(self, key, positions):
+        positions.flags.writeable = False
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key).nbytes
+            if positions.nbytes > self.max_bytes:
+                return positions
+            self.entries[key] = positions
+            self.nbytes += positions.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return positions
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries),
+                'bytes': self.nbytes,
+            }
+
+
+class TokenStore:
+    # Maps short filter tokens back to the dataset and canonical filters they were
+    # minted from, so cached builders can be keyed on strings instead of frames.
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self.tokens = OrderedDict()
+        self.datasets = {}
+        self.lock = threading.Lock()
+
+    def register(self, version, token, df, filters):
+        with self.lock:
+            self.datasets[version] = df
+            self.tokens[(version, token)] = filters
+            self.tokens.move_to_end((version, token))
+            while len(self.tokens) > self.max_tokens:
+                self.tokens.popitem(last=False)
+            live = {key[0] for key in self.tokens}
+            for stale in set(self.datasets) - live:
+                del self.datasets[stale]
+
+    def resolve(self, version, token):
+        with self.lock:
+            filters = self.tokens[(version, token)]
+            self.tokens.move_to_end((version, token))
+            return self.datasets[version], filters
+
+
+class DiskCache:
+    # Size-bounded LRU of pickled values, one file per key. Writes go through a
+    # temporary file and os.replace, so worker processes sharing the directory
+    # never read a partial entry; a hit refreshes the file's mtime, which is the
+    # recency eviction works from. The directory is only scanned once the running
+    # total of bytes written crosses max_bytes, and eviction then trims it to
+    # LOW_WATER of the bound so the next scan is many writes away.
+    LOW_WATER = 0.9
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.nbytes = self.evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return value
+        path = self.path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        except FileNotFoundError:
+            # The directory went with a pruned artifact; leave it gone.
+            return value
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.nbytes += len(data) - replaced
+            if self.nbytes > self.max_bytes:
+                # Other processes write here too, so the scan also resyncs the total.
+                self.nbytes = self.evict()
+        return value
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * self.LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0}
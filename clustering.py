@@ -0,0 +1,184 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.cluster import DBSCAN, KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+import indexes
+
+SWEEP_KS = range(2, 11)
+# Every k is fitted on at most SWEEP_SAMPLE points and scored on SILHOUETTE_SAMPLE,
+# so each fit costs the same on 10k or 1M projects; ks still pending after
+# SWEEP_BUDGET_S seconds are cancelled.
+SWEEP_SAMPLE = 100_000
+SILHOUETTE_SAMPLE = 5_000
+SWEEP_BUDGET_S = 30
+SWEEP_JOBS = 16
+# Every k-means fit, swept or cached, switches to MiniBatchKMeans above
+# MINIBATCH_ROWS points.
+MINIBATCH_ROWS = 50_000
+BATCH_SIZE = 4096
+
+# Hotspot clustering runs on coordinates snapped to a grid of eps / HOTSPOT_SNAP_RATIO
+# (at least HOTSPOT_MIN_SNAP degrees), weighted by how many projects share a cell.
+# The grid coarsens until at most HOTSPOT_MAX_POINTS distinct cells remain.
+HOTSPOT_SNAP_RATIO = 4
+HOTSPOT_MIN_SNAP = 0.0005
+HOTSPOT_MAX_POINTS = 100_000
+NOISE = -1
+
+
+def kmeans(n_rows, k, n_init, seed=42):
+    if n_rows > MINIBATCH_ROWS:
+        return MiniBatchKMeans(n_clusters=k, n_init=n_init, batch_size=BATCH_SIZE, random_state=seed)
+    return KMeans(n_clusters=k, n_init=n_init, random_state=seed)
+
+
+def fit_k(sample, k, seed=42):
+    model = kmeans(len(sample), k, 3, seed).fit(sample)
+    labels = model.labels_
+    silhouette = None
+    if len(np.unique(labels)) > 1:
+        silhouette = float(silhouette_score(
+            sample, labels, sample_size=min(SILHOUETTE_SAMPLE, len(sample)), random_state=seed
+        ))
+    return model.cluster_centers_, float(model.inertia_) / len(sample), silhouette
+
+
+def assign(X, centers):
+    labels = np.zeros(len(X), dtype=np.int32)
+    best = np.full(len(X), np.inf)
+    for label, center in enumerate(centers):
+        distances = (X[:, 0] - center[0]) ** 2 + (X[:, 1] - center[1]) ** 2
+        closer = distances < best
+        best[closer] = distances[closer]
+        labels[closer] = label
+    return labels
+
+
+def canonical(labels, X):
+    # Renumbers zones north to south, then west to east, so the same partition
+    # gets the same ids whichever fit produced it.
+    labels = np.asarray(labels)
+    if not len(labels):
+        return labels.astype(np.int32)
+    n = labels.max() + 1
+    counts = np.maximum(np.bincount(labels, minlength=n), 1)
+    lat = np.bincount(labels, weights=X[:, 0], minlength=n) / counts
+    lon = np.bincount(labels, weights=X[:, 1], minlength=n) / counts
+    rank = np.empty(n, dtype=np.int32)
+    rank[np.lexsort((lon, -lat))] = np.arange(n, dtype=np.int32)
+    return rank[labels]
+
+
+def snap(X, degrees):
+    cells = np.floor(X / degrees).astype(np.int64)
+    keys = (cells[:, 0] + (1 << 20)) << 22 | (cells[:, 1] + (1 << 21))
+    order = np.argsort(keys, kind='stable')
+    starts = np.flatnonzero(np.diff(keys[order], prepend=-1))
+    inverse = np.empty(len(X), dtype=np.int64)
+    inverse[order] = np.cumsum(np.diff(keys[order], prepend=-1) != 0) - 1
+    counts = np.diff(np.append(starts, len(X)))
+    centers = np.add.reduceat(X[order], starts) / counts[:, None]
+    return centers, counts, inverse
+
+
+def hotspots(X, eps_km, min_projects):
+    if not len(X):
+        return np.empty(0, dtype=np.int32)
+    degrees = max(np.degrees(eps_km / indexes.EARTH_RADIUS_KM) / HOTSPOT_SNAP_RATIO, HOTSPOT_MIN_SNAP)
+    points, counts, inverse = snap(X, degrees)
+    while len(points) > HOTSPOT_MAX_POINTS:
+        degrees *= 2
+        points, counts, inverse = snap(X, degrees)
+    model = DBSCAN(
+        eps=eps_km / indexes.EARTH_RADIUS_KM, min_samples=min_projects, metric='haversine', algorithm='ball_tree'
+    ).fit(np.radians(points), sample_weight=counts)
+    return model.labels_[inverse].astype(np.int32)
+
+
+def sample_points(X, size=SWEEP_SAMPLE, seed=42):
+    if len(X) <= size:
+        return X
+    return X[np.sort(np.random.default_rng(seed).choice(len(X), size, replace=False))]
+
+
+class Sweep:
+    def __init__(self, futures):
+        # The budget runs from when the pool first picks up one of the jobs,
+        # not from submission, so time spent queued behind others is not counted.
+        self.started = None
+        self.futures = futures
+
+    def cancel(self):
+        for future in self.futures.values():
+            future.cancel()
+
+    def done(self):
+        if self.started is None and any(future.running() or future.done() for future in self.futures.values()):
+            self.started = time.monotonic()
+        if self.started is not None and time.monotonic() - self.started > SWEEP_BUDGET_S:
+            self.cancel()
+            return True
+        return all(future.done() for future in self.futures.values())
+
+    def progress(self):
+        return sum(future.done() for future in self.futures.values()) / len(self.futures)
+
+    def results(self):
+        return {
+            k: future.result() for k, future in self.futures.items()
+            if future.done() and not future.cancelled() and future.exception() is None
+        }
+
+
+class SweepRunner:
+    # One process pool shared by every session; sweeps are keyed by
+    # (version, token) and only the most recent SWEEP_JOBS are kept. Each owner
+    # (a session) holds one sweep at a time: starting another cancels the
+    # previous one unless a different owner still holds it.
+    def __init__(self, max_workers=None):
+        self.pool = ProcessPoolExecutor(
+            max_workers=max_workers or min(len(SWEEP_KS), os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+        self.sweeps = {}
+        self.owners = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.sweeps.get(key)
+
+    def claim(self, key, owner):
+        with self.lock:
+            self._claim(key, owner)
+
+    def _claim(self, key, owner):
+        if owner is None:
+            return
+        previous = self.owners.pop(owner, None)
+        self.owners[owner] = key
+        while len(self.owners) > SWEEP_JOBS:
+            self.owners.pop(next(iter(self.owners)))
+        if previous is None or previous == key or previous in self.owners.values():
+            return
+        stale = self.sweeps.get(previous)
+        if stale is not None and not stale.done():
+            self.sweeps.pop(previous).cancel()
+
+    def start(self, key, X, owner=None):
+        with self.lock:
+            self._claim(key, owner)
+            if key in self.sweeps:
+                return self.sweeps[key]
+            sample = sample_points(X)
+            sweep = Sweep({k: self.pool.submit(fit_k, sample, k) for k in SWEEP_KS if k <= len(sample)})
+            self.sweeps[key] = sweep
+            while len(self.sweeps) > SWEEP_JOBS:
+                self.sweeps.pop(next(iter(self.sweeps))).cancel()
+            return sweep
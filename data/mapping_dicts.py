@@ -65,4 +65,5 @@ column_interpretations = {
     "ProvincialCapitalLongitude": "Longitude of the provincial capital."
 }
 
-CLUSTER_COLORS = ['red', 'blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'cadetblue']
\ No newline at end of file
+CLUSTER_COLORS = ['red', 'blue', 'green', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'cadetblue']
+SUSPICIOUS_SHARE_COLORS = ['#1a9850', '#91cf60', '#fee08b', '#fc8d59', '#d73027']
@@ -0,0 +1,610 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+import indexes
+import profiling
+
+SOURCE_CSV = "data/dpwh_flood_control_projects.csv"
+CACHE_DIR = "data/.cache"
+
+# Bump whenever clean_frame or the artifact layout changes so existing artifacts are rebuilt.
+PREP_VERSION = 12
+
+RAW_FILE = "raw.arrow"
+PREPARED_FILE = "prepared.arrow"
+PROFILE_FILE = "profile.json"
+CHANGES_FILE = "changes.arrow"
+
+# A refresh matches rows between snapshots on these columns.
+ROW_KEY_COLS = ['ProjectId', 'ContractId']
+CHANGE_COLS = ROW_KEY_COLS + ['ProjectName']
+
+# read_arrow can only hand out a column zero-copy if the prepared table stores
+# it as one contiguous array, so ingest writes the prepared table in record
+# batches of up to PREPARED_BATCH_BYTES. Columns of a larger table are copied
+# when a process loads it.
+PREPARED_BATCH_BYTES = 256 << 20
+
+# Whole-table steps after ingest (text indexes, cost parsing) work through
+# columns SLICE_ROWS rows at a time.
+SLICE_ROWS = 100_000
+
+# The CSV is streamed in blocks of INGEST_BLOCK_BYTES and only RAW_SCHEMA's
+# columns are read, so ingest memory follows the block size, not the file size.
+INGEST_BLOCK_BYTES = 32 << 20
+RAW_SCHEMA = {
+    'MainIsland': pa.string(), 'Region': pa.string(), 'Province': pa.string(),
+    'LegislativeDistrict': pa.string(), 'Municipality': pa.string(), 'DistrictEngineeringOffice': pa.string(),
+    'ProjectId': pa.string(), 'ProjectName': pa.string(), 'TypeOfWork': pa.string(),
+    'FundingYear': pa.int64(), 'ContractId': pa.string(),
+    'ApprovedBudgetForContract': pa.string(), 'ContractCost': pa.string(),
+    'ActualCompletionDate': pa.string(), 'Contractor': pa.string(), 'ContractorCount': pa.int64(),
+    'StartDate': pa.string(), 'ProjectLatitude': pa.float64(), 'ProjectLongitude': pa.float64(),
+    'ProvincialCapital': pa.string(), 'ProvincialCapitalLatitude': pa.float64(),
+    'ProvincialCapitalLongitude': pa.float64(),
+}
+
+RAW_ARROW_SCHEMA = pa.schema(list(RAW_SCHEMA.items()))
+
+# Strings are read as Arrow-backed columns so they stay in the mapped file
+# instead of becoming one Python object per cell.
+ARROW_TYPES = {pa.string(): pd.ArrowDtype(pa.string()), pa.large_string(): pd.ArrowDtype(pa.large_string())}
+
+COST_COLS = ['ContractCost', 'ApprovedBudgetForContract']
+EXCLUDED_YEARS = [2018, 2019, 2020, 2021, 2025]
+
+CATEGORY_COLS = [
+    'MainIsland', 'Region', 'Province', 'Municipality', 'Contractor', 'TypeOfWork',
+    'DistrictEngineeringOffice', 'LegislativeDistrict', 'ProvincialCapital'
+]
+# Widths leave room for typos (a completion year of 2202 is a ~65k-day Duration);
+# anything still out of range becomes null rather than failing the build.
+INT_COLS = {'FundingYear': 'Int16', 'Duration': 'Int32', 'ContractorCount': 'Int16'}
+RATIO_COLS = ['RiskScore', 'BudgetVariance']
+
+# Ratios stay float64 unless explicitly compacted; RiskFlags is computed before
+# any downcast so the risk filters never depend on the ratio precision.
+COMPACT_RATIOS = False
+
+RISK_EXACT = 1
+RISK_OVER = 2
+RISK_AT_LEAST = 4
+
+
+def apply_schema(clean, compact_ratios=COMPACT_RATIOS, categories=None):
+    # categories fixes each category column's dictionary, so frames cleaned chunk
+    # by chunk share one encoding.
+    compact = clean.copy()
+    for col in CATEGORY_COLS:
+        if col not in compact.columns:
+            continue
+        if categories is None:
+            compact[col] = compact[col].astype('category').cat.remove_unused_categories()
+        else:
+            compact[col] = pd.Categorical(compact[col], categories=categories[col])
+    for col, dtype in INT_COLS.items():
+        if col in compact.columns:
+            values = pd.to_numeric(compact[col], errors='coerce').round()
+            limits = np.iinfo(dtype.lower())
+            compact[col] = values.where(values.between(limits.min, limits.max)).astype(dtype)
+
+    risk = compact['RiskScore'].to_numpy(dtype='float64')
+    flags = np.zeros(len(compact), dtype='uint8')
+    flags[np.isclose(risk, 1.0)] |= RISK_EXACT
+    flags[risk > 1.0] |= RISK_OVER
+    flags[risk >= 1.0] |= RISK_AT_LEAST
+    compact['RiskFlags'] = flags
+    compact['IsSuspicious'] = compact['IsSuspicious'].astype('bool')
+
+    if compact_ratios:
+        for col in RATIO_COLS:
+            compact[col] = compact[col].astype('float32')
+    return compact
+
+
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'Before dtype': before.dtypes.astype(str),
+        'Before (bytes)': before.memory_usage(deep=True, index=False),
+        'After dtype': after.dtypes.astype(str),
+        'After (bytes)': after.memory_usage(deep=True, index=False),
+    })
+    sizes = ['Before (bytes)', 'After (bytes)']
+    report[sizes] = report[sizes].fillna(0).astype('int64')
+    report.loc['Total'] = ['', report['Before (bytes)'].sum(), '', report['After (bytes)'].sum()]
+    before_bytes = report['Before (bytes)'].astype('float64')
+    report['Saved %'] = ((1 - report['After (bytes)'] / before_bytes.where(before_bytes > 0)) * 100).round(1)
+    return report
+
+
+def parse_cost(values):
+    if values.dtype == 'object':
+        values = values.astype(str).str.replace(',', '', regex=True)
+    return pd.to_numeric(values, errors='coerce')
+
+
+def clean_frame(data, compact=True, categories=None):
+    if data.empty: return data
+    clean = data.copy()
+
+    for col in COST_COLS:
+        if col in clean.columns:
+            clean[col] = parse_cost(clean[col])
+
+    clean = clean.dropna(subset=['ContractCost', 'ApprovedBudgetForContract'])
+
+    clean['StartDate'] = pd.to_datetime(clean['StartDate'], errors='coerce')
+    clean['ActualCompletionDate'] = pd.to_datetime(clean['ActualCompletionDate'], errors='coerce')
+
+    clean['Duration'] = (clean['ActualCompletionDate'] - clean['StartDate']).dt.days
+
+    clean['FundingYear'] = pd.to_numeric(clean['FundingYear'], errors='coerce')
+    clean = clean.loc[~clean['FundingYear'].isin(EXCLUDED_YEARS)]
+
+    clean['BudgetDifference'] = clean['ApprovedBudgetForContract'] - clean['ContractCost']
+    clean['BudgetVariance'] = (clean['BudgetDifference'] / clean['ApprovedBudgetForContract']) * 100
+    clean['RiskScore'] = (clean['ContractCost'] / clean['ApprovedBudgetForContract'])
+    clean['IsSuspicious'] = clean['RiskScore'] > 1
+
+    col_map = {'ProjectLatitude': 'latitude', 'ProjectLongitude': 'longitude'}
+    clean = clean.rename(columns=col_map)
+    clean = clean.dropna(subset=['latitude', 'longitude'])
+
+    if compact:
+        clean = apply_schema(clean, categories=categories)
+    return clean
+
+
+def source_fingerprint(csv_path=SOURCE_CSV):
+    digest = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"prep-v{PREP_VERSION}-compact-{COMPACT_RATIOS}".encode())
+    return digest.hexdigest()[:16]
+
+
+def artifact_dir(version):
+    return os.path.join(CACHE_DIR, version)
+
+
+def write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def open_arrow(path):
+    # The mapping stays alive for as long as the returned columns reference it.
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def read_arrow(path):
+    # One block per column, so pandas never consolidates (copies) them. Numeric,
+    # datetime, category-code and string columns then read straight from the
+    # mapping, which every session and process on the host shares.
+    return open_arrow(path).to_pandas(split_blocks=True, types_mapper=ARROW_TYPES.get)
+
+
+def open_csv(source, columns=None):
+    # Takes an open Python file: handed a path, the reader buffers far ahead of
+    # the block it is converting.
+    return pv.open_csv(
+        source,
+        read_options=pv.ReadOptions(block_size=INGEST_BLOCK_BYTES),
+        convert_options=pv.ConvertOptions(
+            column_types=RAW_SCHEMA, include_columns=columns or list(RAW_SCHEMA),
+            include_missing_columns=True, strings_can_be_null=True,
+        ),
+    )
+
+
+def scan_categories(csv_path):
+    seen = {col: set() for col in CATEGORY_COLS}
+    with open(csv_path, "rb") as source:
+        for batch in open_csv(source, CATEGORY_COLS):
+            for col in CATEGORY_COLS:
+                seen[col].update(pc.unique(batch.column(col)).drop_null().to_pylist())
+    return {col: sorted(values) for col, values in seen.items()}
+
+
+def prepared_batch(chunk, schema=None):
+    if schema is not None:
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=True)
+    table = pa.Table.from_pandas(chunk, preserve_index=True)
+    # A column that is entirely null in the first chunk has no type to infer yet.
+    fields = [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+def ingest(csv_path, raw_path, prepared_path, categories, prepare=None):
+    # Streams the CSV once: each block is appended to the raw table as read and
+    # to the prepared table after clean_frame (or prepare), keyed by its global
+    # row numbers. Prepared blocks are held back and written as one record batch
+    # per PREPARED_BATCH_BYTES.
+    offset, chunk, schema, writer, sink = 0, None, None, None, None
+    pending = []
+
+    def flush():
+        if pending:
+            writer.write_table(pa.concat_tables(pending).combine_chunks())
+            pending.clear()
+            pa.default_memory_pool().release_unused()
+
+    try:
+        with (open(csv_path, "rb") as source, pa.OSFile(raw_path, "wb") as raw_sink,
+              pa.ipc.new_file(raw_sink, RAW_ARROW_SCHEMA) as raw_writer):
+            for batch in open_csv(source):
+                raw_writer.write_batch(batch)
+                chunk = batch.to_pandas()
+                chunk.index = pd.Index(np.arange(offset, offset + len(chunk)))
+                offset += len(chunk)
+                chunk = prepare(chunk) if prepare else clean_frame(chunk, categories=categories)
+                if chunk.empty:
+                    continue
+                table = prepared_batch(chunk, schema)
+                if writer is None:
+                    schema = table.schema
+                    sink = pa.OSFile(prepared_path, "wb")
+                    writer = pa.ipc.new_file(sink, schema)
+                pending.append(table)
+                if sum(part.nbytes for part in pending) >= PREPARED_BATCH_BYTES:
+                    flush()
+            if writer is not None:
+                flush()
+        if writer is None:
+            if chunk is None:
+                chunk = clean_frame(RAW_ARROW_SCHEMA.empty_table().to_pandas(), categories=categories)
+            sink = pa.OSFile(prepared_path, "wb")
+            writer = pa.ipc.new_file(sink, prepared_batch(chunk).schema)
+    finally:
+        if writer is not None:
+            writer.close()
+        if sink is not None:
+            sink.close()
+
+
+def index_columns(table):
+    return [name for name in (table.schema.pandas_metadata or {}).get('index_columns', []) if isinstance(name, str)]
+
+
+def table_columns(table):
+    skip = set(index_columns(table))
+    return ((name, table.column(name)) for name in table.column_names if name not in skip)
+
+
+def parsed_costs(column, rows=SLICE_ROWS):
+    parts = [parse_cost(column.slice(start, rows).to_pandas()) for start in range(0, len(column), rows)]
+    return pd.concat(parts, ignore_index=True) if parts else pd.Series(dtype='float64')
+
+
+def table_index(table):
+    names = index_columns(table)
+    return table.column(names[0]).to_numpy() if names else np.arange(table.num_rows)
+
+
+def row_keys(frame):
+    ids = [frame[col].fillna('').astype(str) for col in ROW_KEY_COLS]
+    return (ids[0] + '\x1f' + ids[1]).to_numpy(dtype=object)
+
+
+def row_digests(frame):
+    # Integer columns come back as float64 from blocks that hold a null, so they
+    # are hashed as float64 whichever block a row was read in.
+    integers = {col: 'float64' for col, kind in RAW_SCHEMA.items() if pa.types.is_integer(kind)}
+    return pd.util.hash_pandas_object(frame[list(RAW_SCHEMA)].astype(integers), index=False).to_numpy()
+
+
+class SnapshotDiff:
+    # The prepare step of a refresh. A row whose raw digest matches a row of the
+    # previous snapshot reuses that row's prepared values; new and changed rows go
+    # through clean_frame. remap and fresh record where every prepared row came
+    # from, so the text indexes can be patched instead of rebuilt.
+    def __init__(self, directory, raw, prepared, categories):
+        self.directory = directory
+        self.raw = raw
+        self.prepared = prepared
+        self.categories = categories
+
+        keys, digests = [], []
+        for batch in raw.to_batches():
+            frame = batch.to_pandas()
+            keys.append(row_keys(frame))
+            digests.append(row_digests(frame))
+        self.old_keys = pd.Index(np.concatenate(keys) if keys else np.empty(0, dtype=object))
+        digests = np.concatenate(digests) if digests else np.empty(0, dtype=np.uint64)
+        first = ~pd.Index(digests).duplicated()
+        self.digests = pd.Index(digests[first])
+        self.digest_rows = np.flatnonzero(first)
+        self.prepared_of = np.full(raw.num_rows, -1, dtype=np.int64)
+        self.prepared_of[table_index(prepared)] = np.arange(prepared.num_rows)
+
+        self.claimed = np.zeros(prepared.num_rows, dtype=bool)
+        self.remap = np.full(prepared.num_rows, -1, dtype=np.int64)
+        self.fresh = []
+        self.written = 0
+        self.seen = []
+        self.log = []
+
+    def __call__(self, chunk):
+        keys, found = row_keys(chunk), self.digests.get_indexer(row_digests(chunk))
+        self.seen.append(keys)
+        unchanged = found >= 0
+        source = np.full(len(chunk), -1, dtype=np.int64)
+        source[unchanged] = self.prepared_of[self.digest_rows[found[unchanged]]]
+        reuse = source >= 0
+        # Identical rows in the new extract each need their own prepared row.
+        reuse[reuse] = ~self.claimed[source[reuse]] & ~pd.Index(source[reuse]).duplicated()
+        self.claimed[source[reuse]] = True
+
+        added = ~unchanged & ~pd.Index(keys).isin(self.old_keys)
+        self.log.append(chunk.loc[~unchanged, CHANGE_COLS].assign(Change=np.where(added[~unchanged], 'added', 'changed')))
+
+        reused = self.prepared.take(source[reuse]).to_pandas()
+        reused.index = chunk.index[reuse]
+        for col in CATEGORY_COLS:
+            reused[col] = reused[col].cat.set_categories(self.categories[col])
+        recomputed = clean_frame(chunk.loc[~reuse], categories=self.categories)
+        parts = [part for part in (reused, recomputed) if not part.empty]
+        if not parts:
+            return recomputed
+        out = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+
+        positions = self.written + np.arange(len(out))
+        from_reused = out.index.isin(reused.index)
+        self.remap[source[reuse]] = positions[from_reused]
+        self.fresh.append(positions[~from_reused])
+        self.written += len(out)
+        return out
+
+    def text_index(self, col, values):
+        if not indexes.TrigramIndex.exists(self.directory, col):
+            return indexes.TrigramIndex.build(values)
+        previous = indexes.TrigramIndex.load(self.directory, col)
+        fresh = np.concatenate(self.fresh) if self.fresh else np.empty(0, dtype=np.int64)
+        return indexes.TrigramIndex.patch(previous, self.remap, values, fresh)
+
+    def changes(self):
+        seen = pd.Index(np.concatenate(self.seen) if self.seen else np.empty(0, dtype=object))
+        gone = np.flatnonzero(~self.old_keys.isin(seen))
+        removed = self.raw.take(gone).select(CHANGE_COLS).to_pandas().assign(Change='removed')
+        log = pd.concat([frame for frame in self.log + [removed] if not frame.empty] or [removed])
+        return log[['Change'] + CHANGE_COLS].drop_duplicates().reset_index(drop=True)
+
+
+def profile_dataset(raw, prepared):
+    profile = {
+        'prep_version': PREP_VERSION,
+        'raw': profiling.profile_columns(raw.num_rows, table_columns(raw)),
+        'prepared': profiling.profile_columns(prepared.num_rows, table_columns(prepared)),
+    }
+    for col in COST_COLS:
+        if col in raw.column_names:
+            profile['raw']['columns'][col]['parsed'] = profiling.column_profile(parsed_costs(raw.column(col)))
+    return profile
+
+
+def write_profile(profile, path):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f)
+    os.replace(tmp_path, path)
+
+
+def build_artifact(csv_path=SOURCE_CSV, version=None, previous=None):
+    # With previous, rows unchanged since that artifact are carried over instead
+    # of being prepared and indexed again, and the differences go to CHANGES_FILE.
+    version = version or source_fingerprint(csv_path)
+    final = artifact_dir(version)
+    if os.path.exists(os.path.join(final, PREPARED_FILE)):
+        return version
+    # Running apps may still hold the artifact this one replaces, so it is kept
+    # until the next build.
+    current = current_artifact()
+    # Everything is written into a private directory that is renamed into place
+    # whole, so files other processes have mapped are never rewritten.
+    target = f"{final}.{os.getpid()}.tmp"
+    shutil.rmtree(target, ignore_errors=True)
+    os.makedirs(target)
+
+    raw_path, prepared_path = os.path.join(target, RAW_FILE), os.path.join(target, PREPARED_FILE)
+    categories = scan_categories(csv_path)
+    diff = None
+    if previous is not None:
+        source = artifact_dir(previous)
+        diff = SnapshotDiff(source, open_arrow(os.path.join(source, RAW_FILE)),
+                            open_arrow(os.path.join(source, PREPARED_FILE)), categories)
+    ingest(csv_path, raw_path, prepared_path, categories, prepare=diff)
+
+    raw, prepared = open_arrow(raw_path), open_arrow(prepared_path)
+    for col in indexes.TEXT_COLS:
+        if diff:
+            diff.text_index(col, prepared.column(col).to_pandas()).save(target, col)
+        else:
+            indexes.TrigramIndex.write(prepared.column(col), target, col, SLICE_ROWS)
+    indexes.SpatialIndex.build(*(prepared.column(col).to_numpy() for col in indexes.SPATIAL_COLS)).save(target)
+    write_profile(profile_dataset(raw, prepared), os.path.join(target, PROFILE_FILE))
+    if diff is not None:
+        write_arrow(diff.changes(), os.path.join(target, CHANGES_FILE))
+    del raw, prepared
+
+    if os.path.isdir(final) and not os.path.exists(os.path.join(final, PREPARED_FILE)):
+        shutil.rmtree(final, ignore_errors=True)
+    try:
+        os.rename(target, final)
+    except OSError:
+        # Another process finished the same version first; its copy is identical.
+        shutil.rmtree(target, ignore_errors=True)
+
+    prune_artifacts(keep={version, current})
+    return version
+
+
+def building(name):
+    # Whether name is the private directory of a build still running on this host.
+    parts = name.split(".")
+    if len(parts) != 3 or parts[2] != "tmp" or not parts[1].isdigit():
+        return False
+    try:
+        os.kill(int(parts[1]), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def prune_artifacts(keep):
+    if not os.path.isdir(CACHE_DIR): return
+    for name in os.listdir(CACHE_DIR):
+        if name not in keep and not building(name):
+            shutil.rmtree(os.path.join(CACHE_DIR, name), ignore_errors=True)
+
+
+def current_artifact():
+    # The most recently completed artifact, whichever source it was built from.
+    if not os.path.isdir(CACHE_DIR): return None
+    built = [os.path.join(artifact_dir(name), PREPARED_FILE) for name in os.listdir(CACHE_DIR) if not name.endswith(".tmp")]
+    built = [path for path in built if os.path.exists(path)]
+    if not built: return None
+    return os.path.basename(os.path.dirname(max(built, key=os.path.getmtime)))
+
+
+def refresh(new_csv, csv_path=SOURCE_CSV):
+    # Builds the artifact for a republished extract from the current one, then
+    # installs the extract as csv_path so ensure_artifact finds it already built.
+    version = source_fingerprint(new_csv)
+    current = current_artifact()
+    if current != version:
+        previous = load_profile(current) if current else None
+        refreshable = previous is not None and previous.get('prep_version') == PREP_VERSION
+        build_artifact(new_csv, version, previous=current if refreshable else None)
+    if os.path.abspath(new_csv) != os.path.abspath(csv_path):
+        tmp_path = f"{csv_path}.{os.getpid()}.tmp"
+        shutil.copyfile(new_csv, tmp_path)
+        os.replace(tmp_path, csv_path)
+    return version
+
+
+def ensure_artifact(csv_path=SOURCE_CSV):
+    version = source_fingerprint(csv_path)
+    if not os.path.exists(os.path.join(artifact_dir(version), PREPARED_FILE)):
+        build_artifact(csv_path, version)
+    return version
+
+
+def load_text_indexes(version):
+    target = artifact_dir(version)
+    if not all(indexes.TrigramIndex.exists(target, col) for col in indexes.TEXT_COLS):
+        return None
+    return {col: indexes.TrigramIndex.load(target, col) for col in indexes.TEXT_COLS}
+
+
+def load_spatial_index(version):
+    target = artifact_dir(version)
+    if not indexes.SpatialIndex.exists(target):
+        return None
+    return indexes.SpatialIndex.load(target)
+
+
+def load_profile(version):
+    try:
+        with open(os.path.join(artifact_dir(version), PROFILE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def rss_bytes():
+    # Current resident set size; Linux only.
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def session_report(csv_path=SOURCE_CSV, sessions=4, selected=0.25):
+    path = os.path.join(artifact_dir(ensure_artifact(csv_path)), PREPARED_FILE)
+    shared = read_arrow(path)
+    # A filter selecting every 1/selected-th row stands in for a session's filter.
+    positions = np.arange(0, len(shared), max(1, round(1 / selected)), dtype=indexes.position_dtype(len(shared)))
+    modes = {
+        # st.cache_data hands every session its own unpickled copy.
+        'Copied (cache_data)': lambda: pickle.loads(pickle.dumps(shared)),
+        # What another worker process does: attach to the mapped artifact.
+        'Attached (memory map)': lambda: read_arrow(path),
+        # st.cache_resource hands every session the same frame.
+        'Shared (cache_resource)': lambda: shared,
+        # A session holding its filtered frame, against holding only the positions.
+        f'Filtered {selected:.0%}, frame': lambda: shared.iloc[positions],
+        f'Filtered {selected:.0%}, positions': lambda: positions.copy(),
+    }
+    rows = []
+    for mode, load in modes.items():
+        gc.collect()
+        # Arrow keeps freed memory for reuse; hand it back so it is not
+        # counted against (or credited to) the next mode.
+        pa.default_memory_pool().release_unused()
+        before = rss_bytes()
+        held = [load() for _ in range(sessions)]
+        gc.collect()
+        rows.append({'Mode': mode, 'RSS per session (MiB)': round((rss_bytes() - before) / sessions / 2**20, 2)})
+        del held
+    return pd.DataFrame(rows).set_index('Mode')
+
+
+def load_changes(version):
+    path = os.path.join(artifact_dir(version), CHANGES_FILE)
+    return read_arrow(path) if os.path.exists(path) else None
+
+
+def load_raw(csv_path=SOURCE_CSV):
+    version = ensure_artifact(csv_path)
+    raw = read_arrow(os.path.join(artifact_dir(version), RAW_FILE))
+    raw.attrs["version"] = version
+    return raw
+
+
+def load_prepared(csv_path=SOURCE_CSV):
+    version = ensure_artifact(csv_path)
+    prepared = read_arrow(os.path.join(artifact_dir(version), PREPARED_FILE))
+    prepared.attrs["version"] = version
+    return prepared
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+    csv = sys.argv[2] if len(sys.argv) > 2 else SOURCE_CSV
+    if command == "build":
+        built = build_artifact(csv)
+        print(f"Built dataset artifact {built} in {artifact_dir(built)}")
+    elif command == "refresh":
+        if len(sys.argv) < 3:
+            sys.exit("Usage: dataset.py refresh <new extract.csv>")
+        built = refresh(csv)
+        changes = load_changes(built)
+        print(f"Refreshed dataset artifact {built} in {artifact_dir(built)}")
+        if changes is not None:
+            print(changes['Change'].value_counts().to_string())
+    elif command == "sessions":
+        count = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+        print(session_report(csv, count).to_string())
+    elif command == "memory":
+        with open(csv, "rb") as source:
+            raw = open_csv(source).read_pandas()
+        with pd.option_context('display.width', 160, 'display.max_rows', 100):
+            print(memory_report(clean_frame(raw, compact=False), clean_frame(raw)))
+    else:
+        sys.exit(f"Unknown command '{command}'. Use 'build', 'refresh', 'sessions' or 'memory'.")
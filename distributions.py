@@ -0,0 +1,66 @@
+import numpy as np
+
+KDE_GRID = 512
+
+
+def finite(values, log=False):
+    values = np.asarray(values, dtype='float64')
+    keep = np.isfinite(values)
+    if log:
+        keep &= values > 0
+    return values[keep]
+
+
+def bin_edges(values, bins, log=False, value_range=None):
+    low, high = value_range if value_range is not None else (values.min(), values.max())
+    if low == high:
+        low, high = (low / 2, high * 2) if log else (low - 0.5, high + 0.5)
+    if log:
+        return np.geomspace(low, high, bins + 1)
+    return np.linspace(low, high, bins + 1)
+
+
+def histogram(values, bins, log=False, value_range=None):
+    values = finite(values, log)
+    if value_range is not None:
+        values = values[(values >= value_range[0]) & (values <= value_range[1])]
+    if not len(values):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    edges = bin_edges(values, bins, log, value_range)
+    counts, _ = np.histogram(values, bins=edges)
+    return counts, edges
+
+
+def silverman_bandwidth(values):
+    spread = np.std(values)
+    q75, q25 = np.percentile(values, [75, 25])
+    if q75 > q25:
+        spread = min(spread, (q75 - q25) / 1.34)
+    return 0.9 * spread * len(values) ** -0.2 if spread > 0 else 1.0
+
+
+def kde(values, value_range=None, grid=KDE_GRID, bandwidth=None):
+    # Linear binning onto a regular grid followed by an FFT convolution with a
+    # Gaussian kernel, so the cost is O(n + grid log grid) instead of O(n * grid).
+    values = finite(values)
+    if value_range is not None:
+        values = values[(values >= value_range[0]) & (values <= value_range[1])]
+    if len(values) < 2:
+        return np.zeros(0), np.zeros(0)
+    bandwidth = bandwidth or silverman_bandwidth(values)
+    low, high = value_range if value_range is not None else (values.min() - 3 * bandwidth, values.max() + 3 * bandwidth)
+    x = np.linspace(low, high, grid)
+    step = x[1] - x[0]
+
+    position = (values - low) / step
+    left = np.clip(np.floor(position).astype(np.int64), 0, grid - 2)
+    right_weight = np.clip(position - left, 0.0, 1.0)
+    counts = np.bincount(left, weights=1 - right_weight, minlength=grid) + np.bincount(left + 1, weights=right_weight, minlength=grid)
+
+    reach = min(int(np.ceil(4 * bandwidth / step)), grid - 1)
+    offsets = np.arange(-reach, reach + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    size = grid + len(kernel) - 1
+    n_fft = 1 << (size - 1).bit_length()
+    smoothed = np.fft.irfft(np.fft.rfft(counts, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)[reach:reach + grid]
+    return x, np.maximum(smoothed, 0) / len(values)
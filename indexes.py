@@ -0,0 +1,484 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+BITMAP_COLS = ['Region', 'Province', 'Contractor', 'TypeOfWork']
+TEXT_COLS = ['ProjectName', 'ProjectId']
+RANGE_COLS = ['ContractCost', 'Duration', 'FundingYear', 'StartDate']
+KEY_COLS = ['ProjectId']
+SPATIAL_COLS = ['latitude', 'longitude']
+
+EARTH_RADIUS_KM = 6371.0088
+CUBE_DIMS = ['MainIsland', 'Region', 'Province', 'TypeOfWork', 'FundingYear', 'Contractor', 'RiskFlags', 'HasDuration']
+
+
+def position_dtype(n):
+    return np.int32 if n < np.iinfo(np.int32).max else np.int64
+
+
+def empty_bits(n):
+    return np.zeros((n + 7) // 8, dtype=np.uint8)
+
+
+def full_bits(n):
+    return np.packbits(np.ones(n, dtype=bool))
+
+
+def positions_to_bits(positions, n):
+    mask = np.zeros(n, dtype=bool)
+    mask[positions] = True
+    return np.packbits(mask)
+
+
+def bits_to_positions(bits, n):
+    return np.flatnonzero(np.unpackbits(bits, count=n)).astype(position_dtype(n))
+
+
+class BitmapIndex:
+    # Values covering at least 1/32 of the rows keep a packed bitmap, which is
+    # then no larger than their int32 posting list; rarer values keep only the list.
+    DENSE_RATIO = 32
+
+    def __init__(self, values):
+        codes, categories = _codes(values)
+        self.n = len(codes)
+        self.codes = codes
+        self.categories = categories
+        self.lookup = {value: code for code, value in enumerate(categories)}
+
+        order = np.argsort(codes, kind='stable')
+        order = order[codes[order] >= 0]
+        self.counts = np.bincount(codes[order], minlength=len(categories))
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.positions = order.astype(position_dtype(self.n))
+        self.dense = {
+            code: positions_to_bits(self.postings(code), self.n)
+            for code in np.flatnonzero(self.counts * self.DENSE_RATIO >= self.n)
+        }
+
+    def postings(self, code):
+        return self.positions[self.offsets[code]:self.offsets[code + 1]]
+
+    def facet(self, by_count=False):
+        present = np.flatnonzero(self.counts)
+        if by_count:
+            present = present[np.argsort(-self.counts[present], kind='stable')]
+        else:
+            present = sorted(present, key=lambda code: self.categories[code])
+        return {self.categories[code]: int(self.counts[code]) for code in present}
+
+    def counts_within(self, positions):
+        codes = self.codes[positions]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        present = np.flatnonzero(counts)
+        present = present[np.argsort(-counts[present], kind='stable')]
+        return {self.categories[code]: int(counts[code]) for code in present}
+
+    def bits(self, values):
+        result = empty_bits(self.n)
+        sparse = []
+        for value in values:
+            code = self.lookup.get(value)
+            if code is None:
+                continue
+            if code in self.dense:
+                result |= self.dense[code]
+            else:
+                sparse.append(self.postings(code))
+        if sparse:
+            result |= positions_to_bits(np.concatenate(sparse), self.n)
+        return result
+
+
+class SortedIndex:
+    # Permutation of the non-null rows in ascending value order, so a closed
+    # range [lo, hi] is the slice order[searchsorted(lo):searchsorted(hi)].
+    def __init__(self, values):
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            array = values.to_numpy(dtype='datetime64[ns]')
+        else:
+            array = values.to_numpy(dtype='float64', na_value=np.nan)
+        valid = np.flatnonzero(~pd.isna(array))
+        self.order = valid[np.argsort(array[valid], kind='stable')].astype(position_dtype(len(array)))
+        self.sorted = array[self.order]
+
+    def bounds(self):
+        if not len(self.sorted):
+            return None, None
+        return self.sorted[0], self.sorted[-1]
+
+    def range(self, low, high, closed=True):
+        start = np.searchsorted(self.sorted, low, side='left')
+        stop = np.searchsorted(self.sorted, high, side='right' if closed else 'left')
+        return self.order[start:stop]
+
+
+class KeyIndex:
+    # Rows sorted by their string key, so an exact lookup is one binary search.
+    def __init__(self, values):
+        keys = values.astype(str).to_numpy(dtype=object)
+        self.order = np.argsort(keys, kind='stable').astype(position_dtype(len(keys)))
+        self.sorted = keys[self.order]
+
+    def find(self, key):
+        start = np.searchsorted(self.sorted, key, side='left')
+        stop = np.searchsorted(self.sorted, key, side='right')
+        return self.order[start:stop]
+
+
+class SpatialIndex:
+    # Uniform lat/lon grid stored as CSR over the occupied cells only: cells holds
+    # their sorted ids r * n_cols + c and the rows of cells[i] are
+    # order[offsets[i]:offsets[i + 1]], so each grid row of a bounding box is one
+    # contiguous slice. lat/lon are kept in that order. A stray point far from
+    # the rest widens the grid but adds a single cell.
+    CELL_DEGREES = 0.05
+    ARRAYS = ['order', 'cells', 'offsets', 'lat', 'lon', 'grid']
+
+    def __init__(self, order, cells, offsets, lat, lon, grid):
+        self.order = order
+        self.cells = cells
+        self.offsets = offsets
+        self.lat = lat
+        self.lon = lon
+        self.grid = grid
+        self.lat0, self.lon0, self.size = (float(value) for value in grid[:3])
+        self.n_rows, self.n_cols = int(grid[3]), int(grid[4])
+
+    @classmethod
+    def build(cls, lat, lon, cell_degrees=CELL_DEGREES):
+        lat = np.asarray(lat, dtype='float64')
+        lon = np.asarray(lon, dtype='float64')
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        lat0 = np.floor(lat[valid].min()) if len(valid) else 0.0
+        lon0 = np.floor(lon[valid].min()) if len(valid) else 0.0
+        n_rows = int((lat[valid].max() - lat0) // cell_degrees) + 1 if len(valid) else 1
+        n_cols = int((lon[valid].max() - lon0) // cell_degrees) + 1 if len(valid) else 1
+        cells = ((lat[valid] - lat0) // cell_degrees).astype(np.int64) * n_cols + ((lon[valid] - lon0) // cell_degrees).astype(np.int64)
+        sort = np.argsort(cells, kind='stable')
+        occupied, starts = np.unique(cells[sort], return_index=True)
+        offsets = np.append(starts, len(sort)).astype(np.int64)
+        order = valid[sort].astype(position_dtype(len(lat)))
+        grid = np.array([lat0, lon0, cell_degrees, n_rows, n_cols], dtype='float64')
+        return cls(order, occupied.astype(np.int64), offsets, lat[order], lon[order], grid)
+
+    def save(self, directory, name='spatial'):
+        for array in self.ARRAYS:
+            np.save(os.path.join(directory, f"{name}.{array}.npy"), getattr(self, array))
+
+    @classmethod
+    def load(cls, directory, name='spatial'):
+        return cls(*[np.load(os.path.join(directory, f"{name}.{array}.npy"), mmap_mode='r') for array in cls.ARRAYS])
+
+    @classmethod
+    def exists(cls, directory, name='spatial'):
+        return all(os.path.exists(os.path.join(directory, f"{name}.{array}.npy")) for array in cls.ARRAYS)
+
+    def _slices(self, south, west, north, east):
+        r0 = max(int((south - self.lat0) // self.size), 0)
+        r1 = min(int((north - self.lat0) // self.size), self.n_rows - 1)
+        c0 = max(int((west - self.lon0) // self.size), 0)
+        c1 = min(int((east - self.lon0) // self.size), self.n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.int64)
+        first = np.arange(r0, r1 + 1, dtype=np.int64) * self.n_cols
+        starts = self.offsets[np.searchsorted(self.cells, first + c0)]
+        stops = self.offsets[np.searchsorted(self.cells, first + c1 + 1)]
+        lengths = stops - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int64)
+        return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+    def bbox(self, south, west, north, east):
+        slots = self._slices(south, west, north, east)
+        lat, lon = self.lat[slots], self.lon[slots]
+        keep = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.sort(self.order[slots[keep]])
+
+    def within(self, lat, lon, km):
+        dlat = np.degrees(km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        slots = self._slices(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        distances = haversine_km(lat, lon, self.lat[slots], self.lon[slots])
+        keep = distances <= km
+        slots, distances = slots[keep], distances[keep]
+        rank = np.argsort(distances, kind='stable')
+        return self.order[slots[rank]], distances[rank]
+
+    def nearest(self, lat, lon, k):
+        if k <= 0 or not len(self.order):
+            return self.order[:0], np.empty(0)
+        km = np.radians(self.size) * EARTH_RADIUS_KM
+        limit = np.radians(180) * EARTH_RADIUS_KM
+        while True:
+            positions, distances = self.within(lat, lon, km)
+            if len(positions) >= k or km >= limit:
+                return positions[:k], distances[:k]
+            km *= 2
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat, lon, lats, lons = (np.radians(value) for value in (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def normalize_text(text):
+    return str(text).casefold().strip()
+
+
+class TrigramIndex:
+    # Byte trigrams of the casefolded UTF-8 text, stored as a CSR inverted index:
+    # grams[i] owns rows[offsets[i]:offsets[i + 1]], both sorted ascending.
+    CHUNK_ROWS = 100_000
+    ARRAYS = ['grams', 'offsets', 'rows']
+
+    def __init__(self, grams, offsets, rows, values=None):
+        self.grams = grams
+        self.offsets = offsets
+        self.rows = rows
+        self.values = values
+
+    @classmethod
+    def build(cls, values):
+        texts = values.fillna('').astype(str).tolist()
+        n = len(texts)
+        keys = [
+            _trigram_keys(texts[start:start + cls.CHUNK_ROWS], start)
+            for start in range(0, n, cls.CHUNK_ROWS)
+        ]
+        keys = np.sort(np.concatenate(keys)) if keys else np.empty(0, dtype=np.int64)
+        return cls._from_keys(keys, n, values)
+
+    @classmethod
+    def write(cls, column, directory, name, chunk_rows=CHUNK_ROWS):
+        # Builds the index of an Arrow column straight to disk, chunk_rows at a
+        # time. The first pass spills each chunk's sorted keys and counts the
+        # postings of every trigram; the second scatters the spilled rows into
+        # their slots, in row order, so each posting list comes out sorted.
+        n = len(column)
+        spill_path = os.path.join(directory, f"{name}.keys.tmp")
+        grams, counts, sizes = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), []
+        with open(spill_path, "wb") as spill:
+            for start in range(0, n, chunk_rows):
+                texts = column.slice(start, chunk_rows).to_pandas().fillna('').astype(str).tolist()
+                keys = _trigram_keys(texts, start)
+                spill.write(keys.tobytes())
+                sizes.append(len(keys))
+                chunk_grams, chunk_counts = np.unique(keys >> 32, return_counts=True)
+                grams, inverse = np.unique(np.concatenate([grams, chunk_grams]), return_inverse=True)
+                counts = np.bincount(inverse, weights=np.concatenate([counts, chunk_counts]), minlength=len(grams)).astype(np.int64)
+
+        offsets = np.append(0, np.cumsum(counts)).astype(np.int64)
+        rows = np.lib.format.open_memmap(
+            os.path.join(directory, f"{name}.rows.npy"), mode="w+", dtype=position_dtype(n), shape=(int(offsets[-1]),)
+        )
+        cursor = offsets[:-1].copy()
+        with open(spill_path, "rb") as spill:
+            for size in sizes:
+                keys = np.fromfile(spill, dtype=np.int64, count=size)
+                slots = np.searchsorted(grams, keys >> 32)
+                starts = np.flatnonzero(np.diff(slots, prepend=-1))
+                lengths = np.diff(np.append(starts, size))
+                rows[cursor[slots] + np.arange(size) - np.repeat(starts, lengths)] = keys & 0xFFFFFFFF
+                cursor[slots[starts]] += lengths
+        rows.flush()
+        del rows
+        os.remove(spill_path)
+        np.save(os.path.join(directory, f"{name}.grams.npy"), grams.astype(np.uint32))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+
+    @classmethod
+    def patch(cls, index, remap, values, fresh):
+        # remap[old_row] is the row's new position, or -1 if it was dropped or
+        # changed; only the rows at the fresh positions are tokenized again.
+        texts = values.iloc[fresh].fillna('').astype(str).tolist()
+        fresh_keys = _trigram_keys(texts, 0)
+        fresh_keys = (fresh_keys >> 32 << 32) | np.asarray(fresh, dtype=np.int64)[fresh_keys & 0xFFFFFFFF]
+        moved = np.asarray(remap, dtype=np.int64)[np.asarray(index.rows)]
+        grams = np.repeat(np.asarray(index.grams, dtype=np.int64), np.diff(index.offsets))
+        kept = (grams[moved >= 0] << 32) | moved[moved >= 0]
+        return cls._from_keys(np.sort(np.concatenate([kept, fresh_keys])), len(values), values)
+
+    @classmethod
+    def _from_keys(cls, keys, n, values):
+        all_grams = keys >> 32
+        starts = np.flatnonzero(np.diff(all_grams, prepend=-1))
+        offsets = np.append(starts, len(keys)).astype(np.int64)
+        rows = (keys & 0xFFFFFFFF).astype(position_dtype(n))
+        return cls(all_grams[starts].astype(np.uint32), offsets, rows, values)
+
+    def save(self, directory, name):
+        for array in self.ARRAYS:
+            np.save(os.path.join(directory, f"{name}.{array}.npy"), getattr(self, array))
+
+    @classmethod
+    def load(cls, directory, name, values=None):
+        arrays = [np.load(os.path.join(directory, f"{name}.{array}.npy"), mmap_mode='r') for array in cls.ARRAYS]
+        return cls(*arrays, values=values)
+
+    @classmethod
+    def exists(cls, directory, name):
+        return all(os.path.exists(os.path.join(directory, f"{name}.{array}.npy")) for array in cls.ARRAYS)
+
+    def postings(self, gram):
+        i = np.searchsorted(self.grams, gram)
+        if i == len(self.grams) or self.grams[i] != gram:
+            return self.rows[:0]
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def candidates(self, query):
+        grams = _query_grams(query)
+        if grams is None:
+            return None
+        lists = sorted((self.postings(gram) for gram in grams), key=len)
+        found = np.asarray(lists[0])
+        for postings in lists[1:]:
+            if not len(found):
+                break
+            found = np.intersect1d(found, postings, assume_unique=True)
+        return found
+
+    def search(self, query):
+        query = normalize_text(query)
+        found = self.candidates(query)
+        if found is None:
+            found = np.arange(len(self.values))
+        if not len(found):
+            return found
+        texts = self.values.iloc[found].astype(str)
+        return found[texts.str.contains(query, case=False, regex=False, na=False).to_numpy()]
+
+    def ranked(self, query, min_similarity=0.5, limit=None):
+        grams = _query_grams(normalize_text(query))
+        if grams is None:
+            return self.search(query), None
+        hits = np.concatenate([self.postings(gram) for gram in grams])
+        rows, shared = np.unique(hits, return_counts=True)
+        scores = shared / len(grams)
+        keep = scores >= min_similarity
+        rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return rows[order], scores[order]
+
+
+def _trigram_keys(texts, row_offset):
+    encoded = [normalize_text(text).encode() for text in texts]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.int64)
+    row_of_byte = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+    ends = np.cumsum(lengths)
+    starts = np.flatnonzero(np.arange(len(buffer)) + 2 < ends[row_of_byte])
+    grams = (buffer[starts] << 16) | (buffer[starts + 1] << 8) | buffer[starts + 2]
+    keys = np.sort((grams << 32) | (row_of_byte[starts] + row_offset))
+    return keys[np.diff(keys, prepend=-1) != 0]
+
+
+def _query_grams(query):
+    encoded = np.frombuffer(query.encode(), dtype=np.uint8).astype(np.int64)
+    if len(encoded) < 3:
+        return None
+    return np.unique((encoded[:-2] << 16) | (encoded[1:-1] << 8) | encoded[2:])
+
+
+class RollupCube:
+    # One cell per distinct combination of CUBE_DIMS holding the project count and
+    # contract cost sum; cell_of_row maps every row to its cell.
+    def __init__(self, df):
+        frame = df[[dim for dim in CUBE_DIMS if dim in df.columns]].assign(
+            HasDuration=df['Duration'].notna().to_numpy(),
+            ContractCost=df['ContractCost'].to_numpy(),
+        )
+        grouped = frame.groupby(CUBE_DIMS, observed=True, dropna=False, sort=False)
+        self.cell_of_row = grouped.ngroup().to_numpy().astype(position_dtype(len(df)))
+        self.cells = grouped.agg(Count=('ContractCost', 'size'), Cost=('ContractCost', 'sum')).reset_index()
+        self.row_cost = frame['ContractCost'].to_numpy()
+
+    def cells_within(self, positions):
+        cell_ids = self.cell_of_row[positions]
+        counts = np.bincount(cell_ids, minlength=len(self.cells))
+        costs = np.bincount(cell_ids, weights=self.row_cost[positions], minlength=len(self.cells))
+        return self.cells.assign(Count=counts, Cost=costs)[counts > 0]
+
+
+def rollup(cells, dim):
+    totals = cells.groupby(dim, observed=True)[['Count', 'Cost']].sum()
+    totals = totals[totals['Count'] > 0].sort_values('Count', ascending=False, kind='stable').reset_index()
+    totals[dim] = np.asarray(totals[dim])
+    return totals
+
+
+class TableIndex:
+    # Sort permutations (nulls last) and text search for a displayed frame, built
+    # lazily per column on first use and kept for the lifetime of the index.
+    def __init__(self, df, text=None):
+        self.df = df
+        self.n = len(df)
+        self.text = dict(text or {})
+        self.orders = {}
+
+    def order(self, col):
+        if col not in self.orders:
+            values = self.df[col].reset_index(drop=True)
+            order = values.sort_values(kind='stable', na_position='last').index.to_numpy()
+            self.orders[col] = (order.astype(position_dtype(self.n)), int(values.notna().sum()))
+        return self.orders[col]
+
+    def search(self, term):
+        hits = []
+        for col in TEXT_COLS:
+            if col not in self.df.columns:
+                continue
+            if col not in self.text:
+                self.text[col] = TrigramIndex.build(self.df[col])
+            hits.append(self.text[col].search(term))
+        return np.unique(np.concatenate(hits)) if hits else np.arange(self.n)
+
+    def arrange(self, positions=None, sort_col=None, ascending=True, term=None):
+        if term:
+            found = self.search(term)
+            positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+        if sort_col is None:
+            return np.arange(self.n) if positions is None else np.asarray(positions)
+        order, valid = self.order(sort_col)
+        if positions is not None:
+            mask = np.zeros(self.n, dtype=bool)
+            mask[positions] = True
+            head, tail = order[:valid][mask[order[:valid]]], order[valid:][mask[order[valid:]]]
+        else:
+            head, tail = order[:valid], order[valid:]
+        return np.concatenate([head if ascending else head[::-1], tail])
+
+
+class DatasetIndex:
+    def __init__(self, df, version=None, text=None, spatial=None):
+        self.version = version
+        self.n = len(df)
+        self.bitmaps = {col: BitmapIndex(df[col]) for col in BITMAP_COLS if col in df.columns}
+        self.facets = {col: bitmap.facet(by_count=col == 'Contractor') for col, bitmap in self.bitmaps.items()}
+        self.ranges = {col: SortedIndex(df[col]) for col in RANGE_COLS if col in df.columns}
+        self.keys = {col: KeyIndex(df[col]) for col in KEY_COLS if col in df.columns}
+        self.spatial = spatial or SpatialIndex.build(*(df[col].to_numpy(dtype='float64') for col in SPATIAL_COLS))
+        self.cube = RollupCube(df)
+        self.moments = profiling.MomentSketch(df, self.cube.cell_of_row, len(self.cube.cells))
+        self.text = text or {col: TrigramIndex.build(df[col]) for col in TEXT_COLS if col in df.columns}
+        for col, index in self.text.items():
+            index.values = df[col]
+
+    def all_rows(self):
+        return full_bits(self.n)
+
+    def range_bits(self, col, low, high, closed=True):
+        return positions_to_bits(self.ranges[col].range(low, high, closed), self.n)
+
+    def positions(self, bits):
+        return bits_to_positions(bits, self.n)
+
+
+def _codes(values):
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    return values.cat.codes.to_numpy(), values.cat.categories.tolist()
@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+
+def script_json(payload):
+    # The payload is inlined into a <script> block, so "</" is escaped to keep
+    # a value such as "</script>" from closing it.
+    return json.dumps(payload, separators=(',', ':'), allow_nan=False).replace("</", "<\\/")
+
+
+class ProjectLayer(MacroElement):
+    # Draws every project from one columnar payload of coordinates, ids and palette
+    # indices. Markers only carry their ProjectId; details are looked up on click.
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var data = {{ this.payload }};
+            var layer = {{ this._parent.get_name() }};
+            for (var i = 0; i < data.lat.length; i++) {
+                var color = data.palette[data.color[i]];
+                var marker = L.circleMarker([data.lat[i], data.lon[i]], {
+                    radius: 3, fill: true, fillOpacity: 0.7, color: color, fillColor: color
+                });
+                marker.bindTooltip("Project ID: " + data.ids[i]);
+                layer.addLayer(marker);
+            }
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, payload):
+        super().__init__()
+        self._name = "ProjectLayer"
+        self.payload = payload
+
+
+def project_payload(df, color_codes, palette):
+    payload = {
+        'lat': np.round(df['latitude'].to_numpy(dtype='float64'), 5).tolist(),
+        'lon': np.round(df['longitude'].to_numpy(dtype='float64'), 5).tolist(),
+        'ids': df['ProjectId'].astype(str).tolist(),
+        'color': np.asarray(color_codes).tolist(),
+        'palette': list(palette),
+    }
+    return script_json(payload)
+
+
+class CellLayer(MacroElement):
+    # Aggregated grid cells drawn as circles sized by project count and shaded by
+    # their palette index when given, else by suspicious share; clicking a cell
+    # zooms into it.
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var data = {{ this.payload }};
+            var layer = {{ this._parent.get_name() }};
+            for (var i = 0; i < data.lat.length; i++) {
+                var color = data.color ? data.palette[data.color[i]]
+                    : data.palette[Math.min(data.palette.length - 1, Math.floor(data.suspicious[i] * data.palette.length))];
+                var cell = L.circleMarker([data.lat[i], data.lon[i]], {
+                    radius: Math.min(28, 5 + 5 * Math.log10(data.count[i])),
+                    weight: 1, fill: true, fillOpacity: 0.6, color: color, fillColor: color
+                });
+                cell.bindTooltip(data.count[i].toLocaleString("en-US") + " projects &bull; &#8369;"
+                    + data.cost[i].toLocaleString("en-US", {maximumFractionDigits: 0}) + " &bull; "
+                    + (data.suspicious[i] * 100).toFixed(1) + "% suspicious");
+                cell.on("click", function(e) {
+                    e.target._map.setView(e.latlng, Math.min(e.target._map.getZoom() + 2, 18));
+                });
+                layer.addLayer(cell);
+            }
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, payload):
+        super().__init__()
+        self._name = "CellLayer"
+        self.payload = payload
+
+
+def cell_payload(cells, palette, color_codes=None):
+    payload = {
+        'lat': np.round(cells['lat'].to_numpy(dtype='float64'), 5).tolist(),
+        'lon': np.round(cells['lon'].to_numpy(dtype='float64'), 5).tolist(),
+        'count': cells['Count'].astype('int64').tolist(),
+        'cost': np.round(cells['Cost'].to_numpy(dtype='float64'), 2).tolist(),
+        'suspicious': np.round(cells['Suspicious'].to_numpy(dtype='float64'), 4).tolist(),
+        'palette': list(palette),
+    }
+    if color_codes is not None:
+        payload['color'] = np.asarray(color_codes).tolist()
+    return script_json(payload)
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import scipy.sparse as sp
+
+import distributions
+
+PROFILE_BINS = 20
+QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+QUANTILE_LABELS = ['min', '25%', '50%', '75%', 'max']
+DESCRIBE_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+DESCRIBE_COLS = [
+    'FundingYear', 'ApprovedBudgetForContract', 'ContractCost', 'ContractorCount',
+    'Duration', 'BudgetDifference', 'BudgetVariance', 'RiskScore'
+]
+# Columns with at most SKETCH_BINS distinct values are sketched per value, which
+# keeps their quantiles exact; the rest use SKETCH_BINS equal-depth bins whose
+# edges also get a bin of their own, so heavily repeated values stay exact.
+SKETCH_BINS = 1024
+
+
+def column_profile(values, bins=PROFILE_BINS):
+    non_null = int(values.notna().sum())
+    profile = {
+        'dtype': str(values.dtype),
+        'non_null': non_null,
+        'nulls': len(values) - non_null,
+        'distinct': int(values.nunique(dropna=True)),
+    }
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        stamps = values.dropna()
+        if len(stamps):
+            profile['quantiles'] = dict(zip(QUANTILE_LABELS, stamps.quantile(QUANTILES).astype(str)))
+        return profile
+    if pd.api.types.is_bool_dtype(values.dtype) or not pd.api.types.is_numeric_dtype(values.dtype):
+        return profile
+
+    numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+    numbers = numbers[~np.isnan(numbers)]
+    if not len(numbers):
+        return profile
+    profile['sum'] = float(numbers.sum())
+    profile['mean'] = float(numbers.mean())
+    profile['std'] = float(numbers.std(ddof=1)) if len(numbers) > 1 else None
+    profile['quantiles'] = dict(zip(QUANTILE_LABELS, np.quantile(numbers, QUANTILES).tolist()))
+    counts, edges = distributions.histogram(numbers, bins)
+    profile['histogram'] = {'counts': counts.tolist(), 'edges': edges.tolist()}
+    return profile
+
+
+def arrow_profile(column, bins=PROFILE_BINS):
+    # Text and category columns are counted in Arrow, so they never become one
+    # Python object per cell; everything else is profiled as a pandas column.
+    if not (pa.types.is_dictionary(column.type) or pa.types.is_string(column.type)
+            or pa.types.is_large_string(column.type)):
+        return column_profile(column.to_pandas(), bins)
+    if pa.types.is_dictionary(column.type):
+        seen = set()
+        for chunk in column.chunks:
+            seen.update(chunk.dictionary.take(pc.unique(chunk.indices).drop_null()).to_pylist())
+        distinct = len(seen)
+    else:
+        distinct = pc.count_distinct(column).as_py()
+    return {
+        'dtype': str(column.slice(0, 0).to_pandas().dtype),
+        'non_null': len(column) - column.null_count,
+        'nulls': column.null_count,
+        'distinct': distinct,
+    }
+
+
+def profile_columns(rows, columns):
+    return {'rows': rows, 'columns': {col: arrow_profile(column) for col, column in columns}}
+
+
+def structure_table(frame_profile):
+    # Cost columns are reported as parsed numbers when the profile carries them.
+    columns = {col: profile.get('parsed', profile) for col, profile in frame_profile['columns'].items()}
+    return pd.DataFrame({
+        "Column": list(columns),
+        "Non-Null Count": [profile['non_null'] for profile in columns.values()],
+        "Data Type": [profile['dtype'] for profile in columns.values()],
+    }, index=list(columns))
+
+
+def describe_profile(frame_profile, cols):
+    stats = {}
+    for col in cols:
+        profile = frame_profile['columns'][col]
+        quantiles = profile.get('quantiles', {})
+        stats[col] = [float(profile['non_null']), profile.get('mean'), profile.get('std')] + [
+            quantiles.get(label) for label in QUANTILE_LABELS
+        ]
+    return pd.DataFrame(stats, index=DESCRIBE_INDEX, dtype='float64')
+
+
+def sketch_quantile(counts, edges, q, total):
+    # Bin 2i holds the values equal to edges[i] and bin 2i + 1 those strictly
+    # between edges[i] and edges[i + 1]; ranks are spread evenly within a bin and
+    # interpolated linearly between neighbouring order statistics, as pandas does.
+    cumulative = np.cumsum(counts)
+    rank = q * (total - 1)
+    ranks = np.array([np.floor(rank), np.ceil(rank)])
+    bins = np.searchsorted(cumulative, ranks, side='right')
+    before = np.where(bins > 0, cumulative[bins - 1], 0)
+    share = (ranks - before + 0.5) / counts[bins]
+    low = edges[bins // 2]
+    high = np.where(bins % 2, edges[np.minimum(bins // 2 + 1, len(edges) - 1)], low)
+    below, above = low + share * (high - low)
+    return below + (above - below) * (rank - ranks[0])
+
+
+class MomentSketch:
+    # Per-partition count, mean, M2, min and max of every describe column, plus a
+    # sparse partition x bin histogram as the quantile sketch. Partitions merge
+    # exactly for the moments (Chan et al.) and to within one bin for quantiles.
+    def __init__(self, df, partition_of_row, n_partitions, cols=DESCRIBE_COLS, bins=SKETCH_BINS):
+        self.n_partitions = n_partitions
+        self.columns = {}
+        for col in cols:
+            if col not in df.columns:
+                continue
+            values = df[col].to_numpy(dtype='float64', na_value=np.nan)
+            valid = ~np.isnan(values)
+            part, x = partition_of_row[valid], values[valid]
+            count = np.bincount(part, minlength=n_partitions)
+            mean = np.divide(np.bincount(part, weights=x, minlength=n_partitions), count,
+                             out=np.zeros(n_partitions), where=count > 0)
+            m2 = np.bincount(part, weights=(x - mean[part]) ** 2, minlength=n_partitions)
+            low, high = np.full(n_partitions, np.inf), np.full(n_partitions, -np.inf)
+            np.minimum.at(low, part, x)
+            np.maximum.at(high, part, x)
+
+            edges = np.unique(x)
+            if len(edges) > bins:
+                edges = np.unique(np.quantile(x, np.linspace(0, 1, bins + 1)))
+            slot = np.searchsorted(edges, x, side='right') - 1
+            codes = 2 * slot + (x != edges[slot])
+            hist = sp.csr_matrix(
+                (np.ones(len(x), dtype=np.int64), (part, codes)), shape=(n_partitions, max(2 * len(edges) - 1, 1))
+            )
+            self.columns[col] = (count, mean, m2, low, high, edges, hist)
+
+    def describe(self, partitions, cols=DESCRIBE_COLS):
+        partitions = np.asarray(partitions)
+        stats = {}
+        for col in cols:
+            count, mean, m2, low, high, edges, hist = self.columns[col]
+            counts = count[partitions]
+            total = int(counts.sum())
+            if not total:
+                stats[col] = [0.0] + [np.nan] * 7
+                continue
+            overall = float((counts * mean[partitions]).sum() / total)
+            spread = m2[partitions].sum() + (counts * (mean[partitions] - overall) ** 2).sum()
+            std = np.sqrt(spread / (total - 1)) if total > 1 else np.nan
+            lo, hi = low[partitions].min(), high[partitions].max()
+            binned = np.asarray(hist[partitions].sum(axis=0)).ravel()
+            quantiles = [float(np.clip(sketch_quantile(binned, edges, q, total), lo, hi)) for q in QUANTILES[1:-1]]
+            stats[col] = [float(total), overall, std, lo] + quantiles + [hi]
+        return pd.DataFrame(stats, index=DESCRIBE_INDEX, dtype='float64')
@@ -1,6 +1,6 @@
 import streamlit as st
 
-from utils import load_data, prep_data, get_filters, load_css, apply_filter
+from utils import load_data, load_prepared_data, get_filters, load_css, filter_rows, filter_token
 
 load_css()
 CENTER = (11.891783, 122.419922)
@@ -11,11 +11,14 @@ if "zoom" not in st.session_state:
 
 df = load_data()
 st.session_state["df"] = df
-clean_df = prep_data(df)
+clean_df = load_prepared_data()
+st.session_state["clean_df"] = clean_df
 inputs = get_filters(clean_df)
 st.session_state["inputs"] = inputs
-filtered_df = apply_filter(clean_df, inputs)
-st.session_state["filtered_df"] = filtered_df
+st.session_state["filter_token"] = filter_token(clean_df, inputs)
+# Sessions keep only the filtered row positions (shared through the filter
+# cache); pages slice the shared frame while they run.
+st.session_state["filtered_rows"] = filter_rows(clean_df, inputs, st.session_state.setdefault("filter_memo", {}))
 
 home_page = st.Page(
     page="views/overview.py",
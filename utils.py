@@ -1,23 +1,42 @@
-import branca.element
 import folium as fm
-import matplotlib.pyplot as plt
 import pandas as pd
 import plotly.express as px
-import seaborn as sns
+import plotly.graph_objects as go
 import streamlit as st
 from folium import TileLayer
-from sklearn.cluster import KMeans
-from data.mapping_dicts import TypeOfWork_full_color, TypeOfWork_dict, CLUSTER_COLORS
+from plotly.subplots import make_subplots
+from data.mapping_dicts import TypeOfWork_full_color, TypeOfWork_dict, CLUSTER_COLORS, SUSPICIOUS_SHARE_COLORS
+import hashlib
+import html
+import math
+import os
+
 import numpy as np
 
+import caches
+import clustering
+import dataset
+import distributions
+import indexes
+import profiling
+from map_layers import CellLayer, ProjectLayer, cell_payload, project_payload
+
+DATE_FORMAT = '%B-%d-%Y'
+DATE_COLUMN_CONFIG = {
+    'StartDate': st.column_config.DateColumn('StartDate', format="MMMM-DD-YYYY"),
+    'ActualCompletionDate': st.column_config.DateColumn('ActualCompletionDate', format="MMMM-DD-YYYY"),
+}
+
 def load_css():
     with open("styles/main.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-@st.cache_data
+# The raw and prepared frames are cache resources: every session gets the same
+# read-only frame over the memory-mapped artifact rather than its own copy.
+@st.cache_resource(show_spinner=False)
 def load_data():
     try:
-        dataframe = pd.read_csv("data/dpwh_flood_control_projects.csv")
+        dataframe = dataset.load_raw()
         return dataframe
     except FileNotFoundError:
         st.error("File 'dpwh_flood_control_projects.csv' not found.")
@@ -26,109 +45,327 @@ def load_data():
         st.error(f"Error loading data: {e}")
         return pd.DataFrame()
 
-@st.cache_data
-def prep_data(data):
-
-    if data.empty: return data
-    clean = data.copy()
-
-    cols_to_clean = ['ContractCost', 'ApprovedBudgetForContract']
-    for col in cols_to_clean:
-        if col in clean.columns:
-            if clean[col].dtype == 'object':
-                clean[col] = clean[col].astype(str).str.replace(',', '', regex=True)
-            clean[col] = pd.to_numeric(clean[col], errors='coerce')
-
-    clean = clean.dropna(subset=['ContractCost', 'ApprovedBudgetForContract'])
-
-    clean['StartDate'] = pd.to_datetime(clean['StartDate'], errors='coerce')
-    clean['ActualCompletionDate'] = pd.to_datetime(clean['ActualCompletionDate'], errors='coerce')
-
-    clean['Duration'] = (clean['ActualCompletionDate'] - clean['StartDate']).dt.days
-
-    clean['StartDate'] = clean['StartDate'].dt.strftime('%B-%d-%Y')
-    clean['ActualCompletionDate'] = clean['ActualCompletionDate'].dt.strftime('%B-%d-%Y')
-
-    clean['FundingYear'] = pd.to_numeric(clean['FundingYear'], errors='coerce')
-    clean = clean.loc[~clean['FundingYear'].isin([2018, 2019, 2020, 2021, 2025])]
-
-    clean['BudgetDifference'] = clean['ApprovedBudgetForContract'] - clean['ContractCost']
-    clean['BudgetVariance'] = (clean['BudgetDifference'] / clean['ApprovedBudgetForContract']) * 100
-    clean['RiskScore'] = (clean['ContractCost'] / clean['ApprovedBudgetForContract'])
-    clean['IsSuspicious'] = clean['RiskScore'] > 1
-
-    col_map = {'ProjectLatitude': 'latitude', 'ProjectLongitude': 'longitude'}
-    clean = clean.rename(columns=col_map)
-    clean = clean.dropna(subset=['latitude', 'longitude'])
-
-    return clean
-
-def apply_filter(df, inputs):
-    df = df.copy()
-
-    mask = pd.Series([True] * len(df), index=df.index)
-
-    if inputs['search_term']:
-        mask &= df['ProjectName'].str.contains(inputs['search_term'], case=False, na=False)
-    if inputs['search_id']:
-        mask &= df['ProjectId'].astype(str).str.contains(inputs['search_id'], case=False, na=False)
-    if inputs['selected_regions']:
-        mask &= df['Region'].isin(inputs['selected_regions'])
-    if inputs['selected_provinces']:
-        mask &= df['Province'].isin(inputs['selected_provinces'])
-    if inputs['selected_contractors']:
-        mask &= df['Contractor'].isin(inputs['selected_contractors'])
-    if inputs['selected_works']:
-        mask &= df['TypeOfWork'].isin(inputs['selected_works'])
-    if inputs['selected_years']:
-        mask &= (df['FundingYear'] >= inputs['selected_years'][0]) & (df['FundingYear'] <= inputs['selected_years'][1])
-    if inputs.get('cost_range'):
-        min_c, max_c = inputs['cost_range']
-        mask &= (df['ContractCost'] >= min_c) & (df['ContractCost'] <= max_c)
-    if inputs.get('duration_range'):
-        min_d, max_d = inputs['duration_range']
-        mask &= (df['Duration'] >= min_d) & (df['Duration'] <= max_d)
+@st.cache_resource(show_spinner=False)
+def load_prepared_data():
+    try:
+        return dataset.load_prepared()
+    except FileNotFoundError:
+        st.error("File 'dpwh_flood_control_projects.csv' not found.")
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return pd.DataFrame()
+
+@st.cache_data(show_spinner=False)
+def load_profile(version):
+    return dataset.load_profile(version) if version else None
+
+@st.cache_data(show_spinner=False)
+def load_changes(version):
+    return dataset.load_changes(version) if version else None
+
+RISK_FLAGS = {
+    "Exact Match (Score = 1.0)": dataset.RISK_EXACT,
+    "Over Budget (Score > 1.0)": dataset.RISK_OVER,
+    "At or Above Budget (Score ≥ 1.0)": dataset.RISK_AT_LEAST,
+}
+
+EXACT_DESCRIBE_ROWS = 50_000
+
+FILTER_CACHE_BYTES = 256 * 1024 * 1024
+FILTER_TOKENS = 4096
+
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+# The columns the zone map and zone stats read from a clustered frame.
+CLUSTER_COLS = ['ProjectId', 'latitude', 'longitude', 'ContractCost', 'Duration', 'RiskScore', 'IsSuspicious']
+
+NOISE_COLOR = 'gray'
+CLUSTER_STATS_CONFIG = {
+    'Avg Cost': st.column_config.NumberColumn(format="₱%,.0f"),
+    'Min Cost': st.column_config.NumberColumn(format="₱%,.0f"),
+    'Max Cost': st.column_config.NumberColumn(format="₱%,.0f"),
+}
+
+# Below LOD_MIN_ZOOM, or while more than LOD_MAX_POINTS projects are in view,
+# the map shows grid cells of roughly LOD_CELL_PX screen pixels instead of projects.
+LOD_MIN_ZOOM = 11
+LOD_MAX_POINTS = 20_000
+LOD_CELL_PX = 40
+MAP_SIZE = (1000, 500)
+# Viewports are widened to a LOD_SNAP_PX screen-pixel grid so nearby views share
+# an entry in the on-disk map cache.
+LOD_SNAP_PX = 160
+MAP_CACHE_BYTES = 256 * 1024 * 1024
+# Part of every map cache key; bump it when the cached layers or zone labelling change.
+MAP_CACHE_FORMAT = 4
+
+CATEGORY_FILTERS = {
+    'selected_regions': 'Region',
+    'selected_provinces': 'Province',
+    'selected_contractors': 'Contractor',
+    'selected_works': 'TypeOfWork',
+}
+
+@st.cache_resource(show_spinner=False)
+def load_index(version, n_rows, _df):
+    text = dataset.load_text_indexes(version) if version else None
+    spatial = dataset.load_spatial_index(version) if version else None
+    return indexes.DatasetIndex(_df, version, text, spatial)
+
+def dataset_index(df):
+    return load_index(df.attrs.get('version'), len(df), df)
+
+def _clamp(value_range, bounds):
+    low, high = bounds
+    if value_range is None or low is None:
+        return value_range
+    return (max(value_range[0], low.item()), min(value_range[1], high.item()))
+
+def canonical_filters(index, inputs):
+    search_term = indexes.normalize_text(inputs.get('search_term') or '')
+    search_id = indexes.normalize_text(inputs.get('search_id') or '')
     risk_option = inputs.get('risk_filter')
-    if risk_option == "Exact Match (Score = 1.0)":
-        mask &= np.isclose(df['RiskScore'], 1.0)
-    elif risk_option == "Over Budget (Score > 1.0)":
-        mask &= (df['RiskScore'] > 1.0)
-    elif risk_option == "At or Above Budget (Score ≥ 1.0)":
-        mask &= (df['RiskScore'] >= 1.0)
-    return df[mask]
+    date_range = inputs.get('date_range')
+    return (
+        ('search_term', (search_term, bool(inputs.get('fuzzy_search'))) if search_term else None),
+        ('search_id', search_id or None),
+        *((key, tuple(sorted(map(str, inputs.get(key) or []))) or None) for key in CATEGORY_FILTERS),
+        ('selected_years', _clamp(inputs.get('selected_years'), index.ranges['FundingYear'].bounds())),
+        ('date_range', tuple(str(day) for day in date_range) if date_range else None),
+        ('cost_range', _clamp(inputs.get('cost_range'), index.ranges['ContractCost'].bounds())),
+        ('duration_range', _clamp(inputs.get('duration_range'), index.ranges['Duration'].bounds())),
+        ('risk_filter', risk_option if risk_option in RISK_FLAGS else None),
+    )
+
+@st.cache_resource(show_spinner=False)
+def filter_cache():
+    return caches.FilterCache(FILTER_CACHE_BYTES)
+
+def filter_rows(df, inputs, memo=None):
+    index = dataset_index(df)
+    return cached_rows(df, index, canonical_filters(index, inputs), memo)
+
+def cached_rows(df, index, filters, memo=None):
+    key = (index.version, index.n, filters)
+    cache = filter_cache()
+    positions = cache.get(key)
+    if positions is None:
+        positions = cache.put(key, evaluate_filters(df, index, filters, memo))
+    return positions
+
+@st.cache_resource(show_spinner=False)
+def token_store():
+    return caches.TokenStore(FILTER_TOKENS)
+
+def filter_token(df, inputs):
+    index = dataset_index(df)
+    filters = canonical_filters(index, inputs)
+    token = hashlib.sha1(repr((index.n, filters)).encode()).hexdigest()[:16]
+    token_store().register(index.version, token, df, filters)
+    return token
+
+def resolve_token(version, token):
+    df, filters = token_store().resolve(version, token)
+    return df, dataset_index(df), filters
+
+def _name_predicate(df, index, value):
+    term, fuzzy = value
+    if fuzzy:
+        rows, _ = index.text['ProjectName'].ranked(term)
+    else:
+        rows = index.text['ProjectName'].search(term)
+    return indexes.positions_to_bits(rows, index.n)
+
+def _id_predicate(df, index, term):
+    return indexes.positions_to_bits(index.text['ProjectId'].search(term), index.n)
+
+def _category_predicate(col):
+    def predicate(df, index, values):
+        return index.bitmaps[col].bits(values)
+    return predicate
+
+def _range_predicate(col):
+    def predicate(df, index, value_range):
+        return index.range_bits(col, *value_range)
+    return predicate
+
+def _date_predicate(df, index, date_range):
+    start, end = (np.datetime64(day, 'ns') for day in date_range)
+    return index.range_bits('StartDate', start, end + np.timedelta64(1, 'D'), closed=False)
+
+def _risk_predicate(df, index, risk_option):
+    return np.packbits((df['RiskFlags'].to_numpy() & RISK_FLAGS[risk_option]) != 0)
+
+FILTER_PREDICATES = {
+    'search_term': _name_predicate,
+    'search_id': _id_predicate,
+    **{key: _category_predicate(col) for key, col in CATEGORY_FILTERS.items()},
+    'selected_years': _range_predicate('FundingYear'),
+    'date_range': _date_predicate,
+    'cost_range': _range_predicate('ContractCost'),
+    'duration_range': _range_predicate('Duration'),
+    'risk_filter': _risk_predicate,
+}
+
+def evaluate_filters(df, index, filters, memo=None):
+    # memo keeps each predicate's bitmap from the previous rerun of a session, so
+    # moving one control only recomputes that predicate before the final AND.
+    memo = {} if memo is None else memo
+    if memo.get('dataset') != (index.version, index.n):
+        memo.clear()
+        memo['dataset'] = (index.version, index.n)
+    bits = index.all_rows()
+    for name, value in filters:
+        if value is None:
+            continue
+        cached = memo.get(name)
+        if cached is None or cached[0] != value:
+            cached = (value, FILTER_PREDICATES[name](df, index, value))
+            memo[name] = cached
+        bits &= cached[1]
+    return index.positions(bits)
+
+def apply_filter(df, inputs, memo=None):
+    positions = filter_rows(df, inputs, memo)
+    return df if len(positions) == len(df) else df.iloc[positions]
+
+def cube_answerable(index, active):
+    full_cost = active['cost_range'] == _bounds(index, 'ContractCost')
+    full_duration = active['duration_range'] == _bounds(index, 'Duration')
+    return not (active['search_term'] or active['search_id'] or active['date_range']
+                or (active['cost_range'] and not full_cost) or (active['duration_range'] and not full_duration))
+
+def filtered_cells(df, index, filters):
+    # Answers from the rollup cube at cell level when every active filter is a
+    # cube dimension; otherwise re-tallies the cells of the filtered rows.
+    active = dict(filters)
+    cells = index.cube.cells
+    if not cube_answerable(index, active):
+        return index.cube.cells_within(cached_rows(df, index, filters))
+
+    mask = np.ones(len(cells), dtype=bool)
+    for key, col in CATEGORY_FILTERS.items():
+        if active[key]:
+            mask &= cells[col].isin(active[key]).to_numpy()
+    if active['selected_years']:
+        years = cells['FundingYear'].to_numpy(dtype='float64', na_value=np.nan)
+        mask &= (years >= active['selected_years'][0]) & (years <= active['selected_years'][1])
+    if active['duration_range']:
+        mask &= cells['HasDuration'].to_numpy()
+    if active['risk_filter']:
+        mask &= (cells['RiskFlags'].to_numpy() & RISK_FLAGS[active['risk_filter']]) != 0
+    return cells[mask]
+
+def token_rollup(version, token, dim):
+    df, index, filters = resolve_token(version, token)
+    return indexes.rollup(filtered_cells(df, index, filters), dim)
+
+@st.cache_data(show_spinner=False)
+def get_describe(version, token, cols):
+    # Whole-cell selections merge the per-cell moments and sketches; small or
+    # row-level selections fall back to an exact describe() of the rows.
+    df, index, filters = resolve_token(version, token)
+    cols = list(cols)
+    if cube_answerable(index, dict(filters)):
+        cells = filtered_cells(df, index, filters)
+        rows = int(cells['Count'].sum())
+        profile = load_profile(version)
+        if rows == index.n and profile is not None:
+            return profiling.describe_profile(profile['prepared'], cols)
+        if rows > EXACT_DESCRIBE_ROWS:
+            return index.moments.describe(cells.index.to_numpy(), cols)
+    return df.iloc[cached_rows(df, index, filters), df.columns.get_indexer(cols)].describe()
+
+def _bounds(index, col):
+    low, high = index.ranges[col].bounds()
+    return None if low is None else (low.item(), high.item())
+
+def cascaded_facets(df, scope):
+    index = dataset_index(df)
+    positions = filter_rows(df, scope)
+    provinces = index.bitmaps['Province'].counts_within(positions)
+    return dict(sorted(provinces.items())), index.bitmaps['Contractor'].counts_within(positions)
+
+@st.cache_resource(show_spinner=False)
+def load_table_index(version, name, n_rows, _df):
+    text = dataset_index(_df).text if name == "prepared" else None
+    return indexes.TableIndex(_df, text)
+
+def paged_table(df, key, source="prepared", positions=None, columns=None, column_config=None):
+    table = load_table_index(df.attrs.get('version'), source, len(df), df)
+    all_columns = list(df.columns)
+    c1, c2, c3 = st.columns([0.4, 0.35, 0.25], vertical_alignment="bottom")
+    term = c1.text_input("Search Project Name / ID", key=f"{key}_table_search")
+    sort_col = c2.selectbox("Sort by", all_columns, index=None, placeholder="Original order", key=f"{key}_table_sort")
+    ascending = c3.toggle("Ascending", value=True, key=f"{key}_table_ascending")
+    visible = st.multiselect("Columns", all_columns, default=columns or all_columns, key=f"{key}_table_columns")
+
+    ordered = table.arrange(positions, sort_col, ascending, term.strip() or None)
+    c4, c5 = st.columns(2, vertical_alignment="bottom")
+    page_size = c4.selectbox("Rows per page", TABLE_PAGE_SIZES, index=1, key=f"{key}_table_page_size")
+    pages = max(1, math.ceil(len(ordered) / page_size))
+    page_key = f"{key}_table_page"
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = c5.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1, step=1, key=page_key)
+
+    start = (page - 1) * page_size
+    rows = ordered[start:start + page_size]
+    st.dataframe(df.iloc[rows][visible or all_columns], width='stretch', column_config=column_config)
+    if len(ordered):
+        st.caption(f"Rows {start + 1:,}–{start + len(rows):,} of {len(ordered):,}")
+    else:
+        st.caption("No rows match.")
 
 def get_filters(df):
     inputs = {}
+    index = dataset_index(df)
 
     with st.sidebar:
         st.header("Project Filters")
         inputs['risk_filter'] = st.radio("Filter by Risk Score",["All Projects", "Exact Match (Score = 1.0)", "Over Budget (Score > 1.0)", "At or Above Budget (Score ≥ 1.0)"],index=0,key=f"risk_radio")
         inputs['search_term'] = st.text_input("Project Name", placeholder="e.g., River Wall", key="search_term")
+        inputs['fuzzy_search'] = st.toggle("Fuzzy Name Match", value=False, key="fuzzy_search",
+                                           help="Also match project names with small misspellings.")
         inputs['search_id'] = st.text_input("Project ID", placeholder="e.g., P00...", key="search_id")
 
-        regions = sorted(df['Region'].unique().tolist())
-        inputs['selected_regions'] = st.multiselect("Region", regions)
+        cascade = st.toggle("Cascade Options", value=False, key="cascade_facets",
+                            help="Limit province and contractor options to the selected regions and funding years.")
 
-        provinces = sorted(df['Province'].unique().tolist())
-        inputs['selected_provinces'] = st.multiselect("Province", provinces)
+        regions = index.facets['Region']
+        inputs['selected_regions'] = st.multiselect("Region", list(regions), format_func=lambda v: f"{v} ({regions[v]:,})")
 
-        top_contractors = df['Contractor'].value_counts().index.tolist()
-        inputs['selected_contractors'] = st.multiselect("Contractor", top_contractors)
+        provinces, contractors = index.facets['Province'], index.facets['Contractor']
+        if cascade:
+            scope = {'selected_regions': inputs['selected_regions'], 'selected_years': st.session_state.get("year_range")}
+            if any(scope.values()):
+                provinces, contractors = cascaded_facets(df, scope)
+        inputs['selected_provinces'] = st.multiselect("Province", list(provinces), format_func=lambda v: f"{v} ({provinces[v]:,})")
+        inputs['selected_contractors'] = st.multiselect("Contractor", list(contractors), format_func=lambda v: f"{v} ({contractors[v]:,})")
 
         work_keys = sorted(TypeOfWork_dict.keys())
         selected_work_keys = st.multiselect("Type of Work", work_keys)
         inputs['selected_works'] = [TypeOfWork_dict[k] for k in selected_work_keys]
 
         if 'FundingYear' in df.columns:
-            min_y = int(df['FundingYear'].min())
-            max_y = int(df['FundingYear'].max())
-            inputs['selected_years'] = st.slider("Funding Year", min_y, max_y, (min_y, max_y))
+            min_y, max_y = (int(bound) for bound in index.ranges['FundingYear'].bounds())
+            inputs['selected_years'] = st.slider("Funding Year", min_y, max_y, (min_y, max_y), key="year_range")
         else:
             inputs['selected_years'] = None
-        min_cost = int(df['ContractCost'].min())
-        max_cost = int(df['ContractCost'].max())
-        if pd.isna(min_cost): min_cost = 0
-        if pd.isna(max_cost): max_cost = 1
+
+        inputs['date_range'] = None
+        first_start, last_start = index.ranges['StartDate'].bounds()
+        if first_start is not None:
+            min_date, max_date = pd.Timestamp(first_start).date(), pd.Timestamp(last_start).date()
+            date_range = st.date_input("Start Date Range", value=(min_date, max_date),
+                                       min_value=min_date, max_value=max_date, key="date_range")
+            if len(date_range) == 2 and tuple(date_range) != (min_date, max_date):
+                inputs['date_range'] = tuple(date_range)
+
+        min_cost, max_cost = index.ranges['ContractCost'].bounds()
+        min_cost = 0 if min_cost is None else int(min_cost)
+        max_cost = 1 if max_cost is None else math.ceil(max_cost)
 
         manual = st.toggle("Manual Cost Input", value=False, key=f"toggle_cost")
 
@@ -141,8 +378,7 @@ def get_filters(df):
             inputs['cost_range'] = st.slider("Contract Cost Range",min_value=min_cost,max_value=max_cost,value=(min_cost, max_cost),format="₱%d",key="cost_range")
         use_manual_dur = st.toggle("Manual Duration Input", value=False, key=f"toggle_dur")
 
-        min_dur = int(df['Duration'].min())
-        max_dur = int(df['Duration'].max())
+        min_dur, max_dur = (int(bound) for bound in index.ranges['Duration'].bounds())
         if use_manual_dur:
             c3, c4 = st.columns(2)
             min_d_val = c3.number_input("Min Duration (Days)", value=min_dur, key=f"min_dur")
@@ -159,16 +395,24 @@ def get_filters(df):
             )
 
         inputs['enable_clustering'] = st.toggle("Enable Clustering")
+        inputs['cluster_mode'], inputs['n_clusters'], inputs['hotspot'] = "zones", 3, None
         if inputs['enable_clustering']:
-            inputs['n_clusters'] = st.slider("Number of Zones (k)", 2, 10, 3)
-        else:
-            inputs['n_clusters'] = 3
+            inputs['cluster_mode'] = st.radio(
+                "Clustering Method", ["zones", "hotspots"], horizontal=True, key="cluster_mode",
+                format_func=lambda mode: "Zones (k-means)" if mode == "zones" else "Hotspots (density)"
+            )
+            if inputs['cluster_mode'] == "zones":
+                inputs['n_clusters'] = st.slider("Number of Zones (k)", 2, 10, 3)
+            else:
+                inputs['hotspot'] = (
+                    st.slider("Hotspot Radius (km)", 1, 25, 5, key="hotspot_km"),
+                    st.slider("Min. Projects per Hotspot", 3, 200, 10, key="hotspot_min"),
+                )
     return inputs
 
 @st.cache_data
-def get_island_fig(df, chart_type):
-    island_counts = df['MainIsland'].value_counts().reset_index()
-    island_counts.columns = ['MainIsland', 'Count']
+def get_island_fig(version, token, chart_type):
+    island_counts = token_rollup(version, token, 'MainIsland')[['MainIsland', 'Count']]
     if island_counts.empty: return None
 
     if chart_type == "Donut Chart":
@@ -181,9 +425,8 @@ def get_island_fig(df, chart_type):
     return fig
 
 @st.cache_data
-def get_region_fig(df, top_n):
-    region_counts = df['Region'].value_counts().reset_index().head(top_n)
-    region_counts.columns = ['Region', 'Count']
+def get_region_fig(version, token, top_n):
+    region_counts = token_rollup(version, token, 'Region')[['Region', 'Count']].head(top_n)
     if region_counts.empty: return None
     dynamic_height = 150 + (len(region_counts) * 25)
     fig = px.bar(region_counts, x='Count', y='Region', orientation='h',
@@ -192,21 +435,39 @@ def get_region_fig(df, top_n):
     return fig
 
 @st.cache_data
-def get_cost_hist_fig(df, dist_type, bin_count, use_log):
-    if df.empty: return None
-    if dist_type == "Contract Cost":
-        fig = px.histogram(df, x="ContractCost", nbins=bin_count, title="Distribution of Contract Costs")
-    else:
-        fig = px.histogram(df, x="ApprovedBudgetForContract", nbins=bin_count, title="Distribution of Approved Budgets")
+def binned_distribution(version, token, col, bins, log=False, value_range=None, with_kde=False):
+    df, index, filters = resolve_token(version, token)
+    values = df[col].to_numpy(dtype='float64', na_value=np.nan)[cached_rows(df, index, filters)]
+    counts, edges = distributions.histogram(values, bins, log, value_range)
+    result = {'counts': counts, 'edges': edges, 'total': int(counts.sum())}
+    if with_kde:
+        result['kde_x'], result['kde_y'] = distributions.kde(values, value_range)
+    return result
+
+def histogram_trace(binned, log_bins, color=None):
+    counts, edges = binned['counts'], binned['edges']
+    if log_bins:
+        return go.Scatter(x=np.repeat(edges, 2)[1:-1], y=np.repeat(counts, 2), fill='tozeroy', mode='lines',
+                          line=dict(width=1, color=color), name="Projects")
+    return go.Bar(x=edges[:-1], y=counts, width=np.diff(edges), offset=0, marker_color=color, name="Projects")
+
+@st.cache_data
+def get_cost_hist_fig(version, token, dist_type, bin_count, use_log, log_bins=False):
+    col = 'ContractCost' if dist_type == "Contract Cost" else 'ApprovedBudgetForContract'
+    binned = binned_distribution(version, token, col, bin_count, log_bins)
+    if not binned['total']: return None
+    title = "Distribution of Contract Costs" if dist_type == "Contract Cost" else "Distribution of Approved Budgets"
+    fig = go.Figure(histogram_trace(binned, log_bins))
+    fig.update_layout(title=title, xaxis_title=col, yaxis_title="count", bargap=0.1, margin=dict(t=30, b=0, l=0, r=0))
+    if log_bins:
+        fig.update_xaxes(type="log")
     if use_log:
         fig.update_layout(yaxis_type="log")
-    fig.update_layout(bargap=0.1, margin=dict(t=30, b=0, l=0, r=0))
     return fig
 
 @st.cache_data
-def get_project_type_fig(df, chart_type):
-    tow_counts = df['TypeOfWork'].value_counts().reset_index().head(10)
-    tow_counts.columns = ['TypeOfWork', 'Count']
+def get_project_type_fig(version, token, chart_type):
+    tow_counts = token_rollup(version, token, 'TypeOfWork')[['TypeOfWork', 'Count']].head(10)
     if tow_counts.empty: return None
     dynamic_height = 400
     if chart_type == "Bar Chart":
@@ -219,8 +480,9 @@ def get_project_type_fig(df, chart_type):
     return fig
 
 @st.cache_data
-def get_contractor_figs(df):
-    con_val = df.groupby('Contractor')['ContractCost'].sum().sort_values(ascending=False).head(20).reset_index()
+def get_contractor_figs(version, token):
+    contractor_totals = token_rollup(version, token, 'Contractor')
+    con_val = contractor_totals.rename(columns={'Cost': 'ContractCost'}).sort_values('ContractCost', ascending=False).head(20)
     dynamic_height = 150 + (20 * 25)
     if not con_val.empty:
         fig_val = px.bar(con_val, x='ContractCost', y='Contractor', orientation='h',
@@ -230,7 +492,7 @@ def get_contractor_figs(df):
     else:
         fig_val = None
 
-    con_count = df['Contractor'].value_counts().head(20).rename_axis('Contractor').reset_index(name='Count')
+    con_count = contractor_totals.head(20)
     if not con_count.empty:
         fig_vol = px.bar(con_count, x='Count', y='Contractor', orientation='h',
                          title=f"Top {20} Contractors by Volume",
@@ -240,49 +502,318 @@ def get_contractor_figs(df):
         fig_vol = None
     return fig_val, fig_vol
 
-def plot_bid_variance(df):
-    df_zoom = df[(df['BudgetVariance'] > -5) & (df['BudgetVariance'] < 10)]
-    fig, ax = plt.subplots(figsize=(10, 5))
-    sns.histplot(df_zoom['BudgetVariance'], bins=50, kde=True, color='darkred', ax=ax)
-    ax.axvline(0, color='black', linestyle='--', label='Exact Budget Match')
-    ax.set_title("Bid Variance Distribution")
-    ax.set_xlabel("Variance % (0 = Bid matched Budget exactly)")
-    ax.legend()
+@st.cache_data
+def get_bid_variance_fig(version, token):
+    binned = binned_distribution(version, token, 'BudgetVariance', 50, value_range=(-5, 10), with_kde=True)
+    if not binned['total']: return None
+    width = binned['edges'][1] - binned['edges'][0]
+    fig = go.Figure(histogram_trace(binned, False, 'darkred'))
+    fig.add_trace(go.Scatter(x=binned['kde_x'], y=binned['kde_y'] * binned['total'] * width, mode='lines',
+                             line=dict(color='darkred', width=2), name="Density"))
+    fig.add_vline(x=0, line_dash="dash", line_color="black", annotation_text="Exact Budget Match")
+    fig.update_layout(title="Bid Variance Distribution", xaxis_title="Variance % (0 = Bid matched Budget exactly)",
+                      yaxis_title="Count", bargap=0.05, showlegend=False, margin=dict(t=30, b=0, l=0, r=0))
     return fig
 
 
-def perform_clustering(df, n_clusters):
-    cluster_df = df.copy()
+@st.cache_data(show_spinner=False)
+def cluster_labels(version, token, n_clusters):
+    df, index, filters = resolve_token(version, token)
+    X = df[['latitude', 'longitude']].to_numpy(dtype='float64')[cached_rows(df, index, filters)]
+    if len(X) < n_clusters:
+        return None
+    # Always k-means++ with a fixed seed: the map cache is shared across processes
+    # and restarts, so the same (selection, k) must give the same zones everywhere.
+    labels = clustering.kmeans(len(X), n_clusters, 10).fit_predict(X)
+    return clustering.canonical(labels, X)
+
+@st.cache_resource(show_spinner=False)
+def sweep_runner():
+    return clustering.SweepRunner()
+
+def token_points(version, token):
+    df, index, filters = resolve_token(version, token)
+    return df[['latitude', 'longitude']].to_numpy(dtype='float64')[cached_rows(df, index, filters)]
+
+def start_sweep(version, token, owner=None):
+    runner = sweep_runner()
+    runner.claim((version, token), owner)
+    return runner.get((version, token)) or runner.start((version, token), token_points(version, token), owner)
+
+def finished_sweep(version, token):
+    sweep = sweep_runner().get((version, token)) if version and token else None
+    return sweep if sweep is not None and sweep.done() else None
+
+@st.cache_data(show_spinner=False)
+def sweep_labels(version, token, n_clusters):
+    centers, _, _ = finished_sweep(version, token).results()[n_clusters]
+    X = token_points(version, token)
+    return clustering.canonical(clustering.assign(X, centers), X)
+
+@st.cache_resource(show_spinner=False)
+def zone_sources():
+    return {}
+
+def zone_source(version, token, n_clusters):
+    # The first labelling used for a (selection, k) stays in use, so zones do not
+    # change under the user when the background sweep finishes.
+    sweep = finished_sweep(version, token)
+    swept = sweep is not None and n_clusters in sweep.results()
+    sources, key = zone_sources(), (version, token, n_clusters)
+    # A sweep dropped from the runner can no longer serve its labels.
+    if sources.get(key) is None or (sources[key] == 'sweep' and not swept):
+        sources[key] = 'sweep' if swept else 'fit'
+        while len(sources) > FILTER_TOKENS:
+            sources.pop(next(iter(sources)), None)
+    return sources[key]
+
+def sweep_summary(sweep):
+    results = sweep.results()
+    return pd.DataFrame({
+        'k': list(results),
+        'Inertia': [inertia for _, inertia, _ in results.values()],
+        'Silhouette': [silhouette for _, _, silhouette in results.values()],
+    }).sort_values('k')
+
+def get_sweep_fig(summary, n_clusters):
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=summary['k'], y=summary['Inertia'], name="Inertia (elbow)", mode="lines+markers"))
+    fig.add_trace(go.Scatter(x=summary['k'], y=summary['Silhouette'], name="Silhouette", mode="lines+markers"), secondary_y=True)
+    fig.add_vline(x=n_clusters, line_dash="dash", line_color="gray")
+    fig.update_layout(height=320, margin=dict(t=30, b=10), legend=dict(orientation="h", y=1.15), xaxis_title="Number of Zones (k)")
+    fig.update_yaxes(title_text="Mean squared distance", secondary_y=False)
+    fig.update_yaxes(title_text="Silhouette", secondary_y=True)
+    return fig
 
-    if len(cluster_df) < n_clusters:
+@st.cache_data(show_spinner=False)
+def hotspot_labels(version, token, eps_km, min_projects):
+    return clustering.hotspots(token_points(version, token), eps_km, min_projects)
+
+def cluster_stats(cluster_df):
+    stats = cluster_df.groupby('Cluster_ID').agg(**{
+        'Project Count': ('ContractCost', 'count'),
+        'Avg Cost': ('ContractCost', 'mean'),
+        'Min Cost': ('ContractCost', 'min'),
+        'Max Cost': ('ContractCost', 'max'),
+        'Avg Duration (Days)': ('Duration', 'mean'),
+        'Avg Risk Score': ('RiskScore', 'mean'),
+    }).reset_index().rename(columns={'Cluster_ID': 'Cluster Zone'})
+    stats['Avg Duration (Days)'] = stats['Avg Duration (Days)'].astype('float64').round(0)
+    stats['Avg Risk Score'] = stats['Avg Risk Score'].round(4)
+    if (stats['Cluster Zone'] == clustering.NOISE).any():
+        stats['Cluster Zone'] = stats['Cluster Zone'].astype(str).replace(str(clustering.NOISE), "Noise")
+    return stats
+
+def perform_clustering(df, n_clusters, token=None, hotspot=None):
+    # Hotspots handle any number of projects (too few are all noise); zones need
+    # at least one project per zone.
+    if hotspot is None and len(df) < n_clusters:
         return None, None
 
-    X = cluster_df[['latitude', 'longitude']]
+    version = df.attrs.get('version')
+    if hotspot is not None:
+        if version and token:
+            labels = hotspot_labels(version, token, *hotspot)
+        else:
+            labels = clustering.hotspots(df[['latitude', 'longitude']].to_numpy(dtype='float64'), *hotspot)
+    elif version and token and zone_source(version, token, n_clusters) == 'sweep':
+        labels = sweep_labels(version, token, n_clusters)
+    else:
+        labels = cluster_labels(version, token, n_clusters) if version and token else None
+    if labels is None or len(labels) != len(df):
+        X = df[['latitude', 'longitude']].to_numpy(dtype='float64')
+        labels = clustering.canonical(clustering.kmeans(len(X), n_clusters, 10).fit_predict(X), X)
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+    cluster_df = df[CLUSTER_COLS].assign(Cluster_ID=labels)
+    return cluster_df, cluster_stats(cluster_df)
 
-    cluster_df['Cluster_ID'] = kmeans.fit_predict(X)
+def marker_colors(df, enabled_clustering):
+    if enabled_clustering:
+        cluster_ids = df['Cluster_ID'].to_numpy(dtype='int64')
+        codes = np.where(cluster_ids == clustering.NOISE, len(CLUSTER_COLORS), cluster_ids % len(CLUSTER_COLORS))
+        return CLUSTER_COLORS + [NOISE_COLOR], codes
+    palette = list(dict.fromkeys(TypeOfWork_full_color.values())) + ['blue']
+    lookup = {tow: palette.index(color) for tow, color in TypeOfWork_full_color.items()}
+    codes = df['TypeOfWork'].map(lookup).astype('float64').fillna(len(palette) - 1)
+    return palette, codes.to_numpy(dtype='int64')
+
+
+def clicked_project_id(map_state):
+    tooltip = (map_state or {}).get('last_object_clicked_tooltip')
+    if not tooltip or not tooltip.startswith("Project ID:"):
+        return None
+    return tooltip.removeprefix("Project ID:").strip()
+
+
+def project_details(df, project_id):
+    positions = dataset_index(df).keys['ProjectId'].find(project_id)
+    return df.iloc[np.sort(positions)]
+
+
+def project_detail_html(row):
+    color = TypeOfWork_full_color.get(row['TypeOfWork'], 'blue')
+    start = row['StartDate'].strftime(DATE_FORMAT) if pd.notna(row['StartDate']) else "nan"
+    end = row['ActualCompletionDate'].strftime(DATE_FORMAT) if pd.notna(row['ActualCompletionDate']) else "nan"
+    return f"""
+        <div style="font-family: sans-serif; font-size: 13px; line-height: 1.5; border-left: 4px solid {color}; padding-left: 10px;">
+            <b style="font-size: 15px;">{html.escape(str(row['ProjectName']))}</b><br>
+            <span style="color: #2e8b57; font-weight: bold;">₱{row['ContractCost']:,.2f}</span> &bull; {html.escape(str(row['TypeOfWork']))} &bull; FY {row['FundingYear']}<br>
+            <hr style="margin: 8px 0; border: 0; border-top: 1px solid #ccc;">
+            <b>Loc:</b> {html.escape(str(row['Municipality']))}, {html.escape(str(row['LegislativeDistrict']))} ({html.escape(str(row['Region']))})<br>
+            <b>Eng:</b> {html.escape(str(row['DistrictEngineeringOffice']))}<br>
+            <b>Time:</b> {start} &ndash; {end} <i>({row['Duration']} days)</i><br>
+            <b>By:</b> {html.escape(str(row['Contractor']))}<br>
+            <b>Risk Score: {row['RiskScore']:.2f} </b>
+        </div>
+    """
+
+
+def degrees_per_pixel(zoom):
+    return 360 / (256 * 2 ** zoom)
+
+
+def map_view(map_state, center, zoom):
+    state = map_state or {}
+    bounds = state.get('bounds') or {}
+    south_west, north_east = bounds.get('_southWest') or {}, bounds.get('_northEast') or {}
+    zoom = state.get('zoom') or zoom
+    if None in (south_west.get('lat'), south_west.get('lng'), north_east.get('lat'), north_east.get('lng')):
+        half_lat = MAP_SIZE[1] / 2 * degrees_per_pixel(zoom)
+        half_lon = MAP_SIZE[0] / 2 * degrees_per_pixel(zoom)
+        return (center[0] - half_lat, center[1] - half_lon, center[0] + half_lat, center[1] + half_lon), zoom
+    return (south_west['lat'], south_west['lng'], north_east['lat'], north_east['lng']), zoom
+
+
+def in_view(df, bounds, spatial=None):
+    if spatial is None:
+        south, west, north, east = bounds
+        lat, lon = df['latitude'].to_numpy(), df['longitude'].to_numpy()
+        return df[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+    index, rows = spatial
+    if not len(rows):
+        return df.iloc[:0]
+    found = index.bbox(*bounds)
+    at = np.minimum(np.searchsorted(rows, found), len(rows) - 1)
+    return df.iloc[at[rows[at] == found]]
+
+
+def nearby_projects(df, lat, lon, k=None, km=None, exclude=()):
+    spatial = dataset_index(df).spatial
+    if km is None:
+        positions, distances = spatial.nearest(lat, lon, k + len(exclude))
+    else:
+        positions, distances = spatial.within(lat, lon, km)
+    nearby = df.iloc[positions].assign(**{'Distance (km)': np.round(distances, 2)})
+    nearby = nearby[~nearby['ProjectId'].isin(exclude)]
+    return nearby if k is None else nearby.head(k)
+
+
+def grid_cells(df, zoom, by=()):
+    # Each (cell, *by) group becomes one aggregate; the by columns are kept.
+    size = LOD_CELL_PX * degrees_per_pixel(zoom)
+    lat, lon = df['latitude'].to_numpy(dtype='float64'), df['longitude'].to_numpy(dtype='float64')
+    frame = pd.DataFrame({
+        'row': np.floor(lat / size).astype('int64'), 'col': np.floor(lon / size).astype('int64'),
+        'lat': lat, 'lon': lon, 'cost': df['ContractCost'].to_numpy(dtype='float64'),
+        'suspicious': df['IsSuspicious'].to_numpy(dtype='float64'),
+        **{column: df[column].to_numpy() for column in by},
+    })
+    return frame.groupby(['row', 'col', *by], sort=False).agg(
+        lat=('lat', 'mean'), lon=('lon', 'mean'), Count=('lat', 'size'), Cost=('cost', 'sum'),
+        Suspicious=('suspicious', 'mean')
+    ).reset_index().drop(columns=['row', 'col'])
+
+
+def snap_view(view):
+    bounds, zoom = view
+    step = LOD_SNAP_PX * degrees_per_pixel(zoom)
+    south, west, north, east = bounds
+    snapped = (math.floor(south / step) * step, math.floor(west / step) * step,
+               math.ceil(north / step) * step, math.ceil(east / step) * step)
+    return tuple(round(value, 6) for value in snapped), zoom
+
+
+def viewport_layer(df, view, enabled_clustering, render_mode, spatial=None):
+    bounds, zoom = view
+    visible = in_view(df, bounds, spatial)
+    if visible.empty:
+        return None, None, "No projects in view."
+    if zoom < LOD_MIN_ZOOM or len(visible) > LOD_MAX_POINTS:
+        if enabled_clustering:
+            # One aggregate per zone within each cell, so zones stay visible when zoomed out.
+            cells = grid_cells(visible, zoom, by=['Cluster_ID'])
+            palette, color_codes = marker_colors(cells, enabled_clustering)
+            payload, shading = cell_payload(cells, palette, color_codes), "the zone (Noise in gray)"
+        else:
+            cells = grid_cells(visible, zoom)
+            payload, shading = cell_payload(cells, SUSPICIOUS_SHARE_COLORS), "the suspicious share"
+        return "cells", payload, (
+            f"{len(visible):,} projects in view, grouped into {len(cells):,} cells. "
+            f"Zoom in to level {LOD_MIN_ZOOM} to see individual projects; cell colour shows {shading}.")
+    palette, color_codes = marker_colors(visible, enabled_clustering)
+    caption = f"Showing the {len(visible):,} projects in view."
+    if render_mode == "markers":
+        colors = [palette[code] for code in color_codes]
+        return "markers", list(zip(visible['ProjectId'].values, visible['latitude'].values, visible['longitude'].values, colors)), caption
+    return "projects", project_payload(visible, color_codes, palette), caption
+
+
+def layer_group(kind, payload):
+    fg = fm.FeatureGroup(name="DPWH Projects")
+    if kind == "cells":
+        fg.add_child(CellLayer(payload))
+    elif kind == "projects":
+        fg.add_child(ProjectLayer(payload))
+    elif kind == "markers":
+        for pid, lat, lon, color in payload:
+            fm.CircleMarker(
+                location=[lat, lon], radius=3, fill=True, fill_opacity=0.7, tooltip=f"Project ID: {pid}",
+                fill_color=color, color=color
+            ).add_to(fg)
+    return fg
 
-    stats = cluster_df.groupby('Cluster_ID').agg({
-        'ContractCost': ['count', 'mean', 'min', 'max'],
-        'Duration': 'mean',
-        'RiskScore': 'mean'
-    }).reset_index()
 
-    stats.columns = ['Cluster Zone', 'Project Count', 'Avg Cost', 'Min Cost', 'Max Cost', 'Avg Duration (Days)', 'Avg Risk Score']
+@st.cache_resource(show_spinner=False)
+def map_cache(version):
+    # None once the artifact has been pruned, rather than recreating its directory.
+    if not os.path.isdir(dataset.artifact_dir(version)):
+        return None
+    return caches.DiskCache(os.path.join(dataset.artifact_dir(version), "maps"), MAP_CACHE_BYTES)
 
-    stats['Avg Cost'] = stats['Avg Cost'].apply(lambda x: f"₱{x:,.0f}")
-    stats['Min Cost'] = stats['Min Cost'].apply(lambda x: f"₱{x:,.0f}")
-    stats['Max Cost'] = stats['Max Cost'].apply(lambda x: f"₱{x:,.0f}")
-    stats['Avg Duration (Days)'] = stats['Avg Duration (Days)'].round(0)
-    stats['Avg Risk Score'] = stats['Avg Risk Score'].round(4)
-    return cluster_df, stats
 
-def create_map(df, center, zoom, n_clusters=3, enabled_clustering=False):
+def create_map(df, center, zoom, n_clusters=3, enabled_clustering=False, render_mode="vector", view=None, spatial=None, token=None, hotspot=None):
+    version = df.attrs.get('version')
+    cache = map_cache(version) if version and token else None
+    settings = None
     if enabled_clustering:
-        df, stats = perform_clustering(df, n_clusters)
-    else:
-        stats = []
+        # Zones record which labelling drew them; the disk cache is shared by
+        # processes that may have pinned different ones.
+        if hotspot:
+            settings = ('hotspots', *hotspot)
+        else:
+            settings = ('zones', n_clusters, zone_source(version, token, n_clusters) if version and token else 'fit')
+
+    clustered, stats = None, []
+    if enabled_clustering:
+        stats = cache.get(('stats', MAP_CACHE_FORMAT, version, token, settings)) if cache else None
+        if stats is None:
+            clustered, stats = perform_clustering(df, n_clusters, token, hotspot)
+            if stats is None:
+                # Fewer projects than zones: draw them unclustered.
+                enabled_clustering, settings, stats = False, None, pd.DataFrame()
+            elif cache:
+                cache.put(('stats', MAP_CACHE_FORMAT, version, token, settings), stats)
+
+    view = snap_view(view or map_view(None, center, zoom))
+    layer_key = ('layer', MAP_CACHE_FORMAT, version, token, settings, render_mode, view, LOD_MIN_ZOOM, LOD_MAX_POINTS, LOD_CELL_PX)
+    layer = cache.get(layer_key) if cache else None
+    if layer is None:
+        if enabled_clustering and clustered is None:
+            clustered, _ = perform_clustering(df, n_clusters, token, hotspot)
+        layer = viewport_layer(clustered if enabled_clustering else df, view, enabled_clustering, render_mode, spatial)
+        if cache:
+            cache.put(layer_key, layer)
+    kind, payload, caption = layer
 
     m = fm.Map(location=center, zoom_start=zoom, control_scale=True, prefer_canvas=True, tiles=None)
     TileLayer(
@@ -304,48 +835,5 @@ def create_map(df, center, zoom, n_clusters=3, enabled_clustering=False):
     TileLayer("OpenStreetMap", name="Street Map", show=False).add_to(m)
 
     fm.plugins.Fullscreen(position="bottomleft", title="Expand me", title_cancel="Exit me", force_separate_button=True).add_to(m)
-    fg = fm.FeatureGroup(name="DPWH Projects)")
-
-    if not df.empty:
-        id, lats, lons = df['ProjectId'].values, df['latitude'].values, df['longitude'].values
-        names, regions, costs = df['ProjectName'].values, df['Region'].values, df['ContractCost'].values
-        startdates, enddates, durations = df['StartDate'].values, df['ActualCompletionDate'].values, df['Duration'].values
-        contractors, fundingyears = df['Contractor'].values, df['FundingYear'].values
-        legDist, Municipality, engDist = df['LegislativeDistrict'].values, df['Municipality'].values, df['DistrictEngineeringOffice'].values
-        risks, tow_vals = df['RiskScore'].values, df['TypeOfWork'].values
-
-        if enabled_clustering:
-            cluster_ids = df['Cluster_ID'].values
-        else:
-            cluster_ids = [0] * len(df)
-
-        for pid, lat, lon, name, region, cost, start, end, dur, cont, fund, ld, mun, ed, risk, tow, cluster_id in zip(id, lats, lons, names, regions, costs, startdates, enddates, durations, contractors, fundingyears, legDist, Municipality, engDist, risks, tow_vals, cluster_ids):
-            formatted_cost = f"₱{cost:,.2f}"
-            cid = int(cluster_id)
-            if enabled_clustering:
-                color = CLUSTER_COLORS[cid % len(CLUSTER_COLORS)]
-            else:
-                color = TypeOfWork_full_color.get(tow, 'blue')
-            popup_html = f"""
-                            <div style="font-family: sans-serif; font-size: 12px; line-height: 1.4; color: #333;">
-                                <b style="font-size: 14px; color: #000;">{name}</b><br>
-                                <span style="color: #006400; font-weight: bold;">{formatted_cost}</span> &bull; {tow} &bull; FY {fund}
-                                <span style="color:{color}; font-weight:bold;"> {"Zone "+ str(cid) if enabled_clustering else ""}</span><br>
-                                <hr style="margin: 8px 0; border: 0; border-top: 1px solid #ccc;">
-                                <b>Loc:</b> {mun}, {ld} ({region})<br>
-                                <b>Eng:</b> {ed}<br>
-                                <b>Time:</b> {start} &ndash; {end} <i>({dur} days)</i><br>
-                                <b>By:</b> {cont}<br>
-                                <b>Risk Score: {risk:.2f} </b>
-                            </div>
-                        """
-            iframe = branca.element.IFrame(html=popup_html, width="520px", height="190px")
-            pp = fm.Popup(iframe, max_width=500)
-            mark = fm.CircleMarker(
-                location=[lat, lon], radius=3, fill=True, fill_opacity=0.7, tooltip=f"Project ID: {pid}", popup=pp,
-                fill_color=color, color=color
-            )
-            fg.add_child(mark)
-    fg.add_to(m)
-    fm.LayerControl(position='bottomleft').add_to(m)
-    return m, stats
+    layers = {'feature_group_to_add': layer_group(kind, payload), 'layer_control': fm.LayerControl(position='bottomleft')}
+    return m, layers, stats, caption
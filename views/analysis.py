@@ -1,16 +1,96 @@
+import uuid
+
 import streamlit as st
 import streamlit.components.v1 as components
+from streamlit.errors import StreamlitAPIException
 from streamlit_folium import st_folium
 
 from utils import (
-    create_map, plot_bid_variance,
-    TypeOfWork_full_color
+    apply_filter, create_map, get_bid_variance_fig, clicked_project_id, project_details, project_detail_html, map_view,
+    dataset_index, filter_rows, nearby_projects, paged_table, sweep_runner, start_sweep, sweep_summary, get_sweep_fig,
+    TypeOfWork_full_color, DATE_COLUMN_CONFIG, CLUSTER_STATS_CONFIG
 )
 
 st.set_page_config(layout="centered", page_title="Analysis")
-if 'filtered_df' in st.session_state and 'inputs' in st.session_state:
-    filtered_df = st.session_state['filtered_df']
+
+
+def nearby_panel(clean_df, details):
+    st.markdown("**Nearby Projects**")
+    c1, c2 = st.columns(2)
+    nearby_mode = c1.radio("Search", ["Nearest", "Within radius"], horizontal=True, key="nearby_mode")
+    lat, lon = details['latitude'].iloc[0], details['longitude'].iloc[0]
+    exclude = details['ProjectId'].tolist()
+    if nearby_mode == "Nearest":
+        k = c2.slider("Number of projects", 1, 50, 10, key="nearby_k")
+        nearby = nearby_projects(clean_df, lat, lon, k=k, exclude=exclude)
+    else:
+        km = c2.slider("Radius (km)", 1, 50, 5, key="nearby_km")
+        nearby = nearby_projects(clean_df, lat, lon, km=km, exclude=exclude)
+    cols = ['Distance (km)', 'ProjectId', 'ProjectName', 'TypeOfWork', 'Contractor', 'ContractCost', 'StartDate', 'RiskScore']
+    st.dataframe(nearby[cols], column_config=DATE_COLUMN_CONFIG, hide_index=True)
+
+
+@st.fragment(run_every=1)
+def sweep_progress(version, token):
+    sweep = sweep_runner().get((version, token))
+    if sweep is None or sweep.done():
+        st.rerun()
+    st.progress(sweep.progress(), text="Comparing k = 2 to 10 in the background...")
+
+
+def zone_diagnostics(version, token, n_clusters):
+    if not version or not token:
+        return
+    sweep = start_sweep(version, token, st.session_state.setdefault("sweep_owner", uuid.uuid4().hex))
+    if not sweep.done():
+        sweep_progress(version, token)
+        return
+    summary = sweep_summary(sweep)
+    if summary.empty:
+        return
+    st.write("Choosing the Number of Zones:")
+    st.plotly_chart(get_sweep_fig(summary, n_clusters), width='stretch')
+    st.caption("Look for the bend in the inertia curve and the highest silhouette. "
+               "Every k is already fitted, so moving the slider is instant.")
+
+
+@st.fragment
+def project_map(inp, render_mode):
+    center, zoom = st.session_state["center"], st.session_state["zoom"]
+    clean_df = st.session_state['clean_df']
+    view = map_view(st.session_state.get("map_state"), center, zoom)
+    spatial = (dataset_index(clean_df).spatial, filter_rows(clean_df, inp, st.session_state.get("filter_memo")))
+    filtered_df = apply_filter(clean_df, inp, st.session_state.get("filter_memo"))
+    m, layers, stats, caption = create_map(
+        filtered_df, center, zoom, inp['n_clusters'], inp['enable_clustering'], render_mode, view, spatial,
+        st.session_state.get("filter_token"), inp.get('hotspot')
+    )
+    map_state = st_folium(
+        m, height=500, width=1000, returned_objects=["last_object_clicked_tooltip", "bounds", "zoom"], **layers
+    )
+    st.session_state["map_state"] = map_state
+    if map_view(map_state, center, zoom) != view:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            st.rerun()
+    st.caption(caption)
+
+    project_id = clicked_project_id(map_state)
+    if project_id:
+        details = project_details(clean_df, project_id)
+        for _, row in details.iterrows():
+            st.markdown(project_detail_html(row), unsafe_allow_html=True)
+        if not details.empty:
+            nearby_panel(clean_df, details)
+    else:
+        st.caption("Click a project marker to see its details.")
+    return stats
+
+
+if 'filtered_rows' in st.session_state and 'inputs' in st.session_state:
     inp = st.session_state['inputs']
+    filtered_df = apply_filter(st.session_state['clean_df'], inp, st.session_state.get("filter_memo"))
 else:
     st.error("Data not initialized. Please run the app from main.")
 
@@ -40,11 +120,11 @@ else:
     st.markdown("""
     <div class="section-title">Geospatial Analysis</div>
     """, unsafe_allow_html=True)
-    if inp['enable_clustering']:
-        m, stats = create_map(filtered_df, st.session_state["center"], st.session_state["zoom"], inp['n_clusters'], True)
-    else:
-        m, stats = create_map(filtered_df, st.session_state["center"], st.session_state["zoom"], inp['n_clusters'], False)
-    st_folium(m, height=500, returned_objects=[], width=1000)
+    render_mode = st.radio(
+        "Marker Rendering", ["vector", "markers"], horizontal=True, key="render_mode",
+        format_func=lambda mode: "Single layer" if mode == "vector" else "Per-project markers (slow)"
+    )
+    stats = project_map(inp, render_mode)
 
     if not inp['enable_clustering']:
         with st.expander("Type of Work Legend"):
@@ -64,7 +144,12 @@ else:
     else:
         if not stats.empty:
             st.write("Clustering Statistics:")
-            st.dataframe(stats)
+            st.dataframe(stats, column_config=CLUSTER_STATS_CONFIG)
+        if inp.get('cluster_mode') == "hotspots":
+            st.caption("Hotspots group projects with at least the chosen number of neighbours within the radius "
+                       "(great-circle distance). Projects outside any hotspot are shown in gray as Noise.")
+        else:
+            zone_diagnostics(st.session_state['clean_df'].attrs.get('version'), st.session_state.get("filter_token"), inp['n_clusters'])
 
     with st.expander("Map Susceptibility Legend"):
         c1, c2 = st.columns(2, vertical_alignment="center")
@@ -147,11 +232,14 @@ else:
         * **Risk Score ≥ 1**: The total number of projects that hit or exceeded the maximum allowable government cost.
         """)
     st.subheader("**Bid Variance**")
-    fig_var = plot_bid_variance(filtered_df)
-    st.pyplot(fig_var)
+    fig_var = get_bid_variance_fig(st.session_state['clean_df'].attrs.get('version'), st.session_state.get("filter_token"))
+    if fig_var: st.plotly_chart(fig_var, width='stretch')
+    else: st.info("No bids within -5% to 10% of the budget.")
 
     with st.expander("View Raw Data Table"):
-        st.dataframe(filtered_df, width='stretch')
+        clean_df = st.session_state['clean_df']
+        paged_table(clean_df, "filtered", positions=filter_rows(clean_df, inp, st.session_state.get("filter_memo")),
+                    column_config=DATE_COLUMN_CONFIG)
 
 
 st.markdown(
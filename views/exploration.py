@@ -1,9 +1,7 @@
 import streamlit as st
-import plotly.express as px
 from utils import (
-    load_css, load_data, prep_data, get_filters,
-    get_island_fig, get_region_fig, get_cost_hist_fig,
-    get_project_type_fig, get_contractor_figs
+    load_css, get_island_fig, get_region_fig, get_cost_hist_fig,
+    get_project_type_fig, get_contractor_figs, get_describe
 )
 
 st.set_page_config(layout="centered", page_title="Exploration")
@@ -13,13 +11,15 @@ load_css()
 
 st.markdown('<div class="title-card">Data exploration</div>', unsafe_allow_html=True)
 
-if 'filtered_df' in st.session_state and 'inputs' in st.session_state:
-    filtered_df = st.session_state['filtered_df']
+if 'filtered_rows' in st.session_state and 'inputs' in st.session_state:
+    filtered_rows = st.session_state['filtered_rows']
+    version = st.session_state['clean_df'].attrs.get('version')
+    token = st.session_state['filter_token']
 else:
     st.error("Data not initialized. Please run the app from main.")
     st.stop()
 
-if filtered_df.empty:
+if not len(filtered_rows):
     st.warning("No data matches your current filters. Please adjust the sidebar filters.")
 else:
     # 1. GEOGRAPHIC DISTRIBUTION
@@ -36,14 +36,14 @@ else:
             horizontal=True,
             label_visibility="collapsed"
         )
-        fig_island = get_island_fig(filtered_df, island_chart_type)
+        fig_island = get_island_fig(version, token, island_chart_type)
         if fig_island: st.plotly_chart(fig_island, width='stretch')
         else: st.info("No data available.")
 
     with col2:
         st.markdown('<div class="section-container"><b>Regional Distribution</b></div>', unsafe_allow_html=True)
         top_n_regions = st.slider("Show Top N Regions", min_value=5, max_value=17, value=10, key="region_slider")
-        fig_region = get_region_fig(filtered_df, top_n_regions)
+        fig_region = get_region_fig(version, token, top_n_regions)
         if fig_region: st.plotly_chart(fig_region, width='stretch')
         else: st.info("No data available.")
 
@@ -58,19 +58,20 @@ else:
         use_log = st.toggle("Logarithmic Scale", value=True, help="Switch to Log scale to see outliers better.")
         dist_type = st.radio("Distribution Type", ["Contract Cost", "Approved Budget"], horizontal=True, key="hist_toggle")
         bin_count = st.slider("Number of Bins", min_value=10, max_value=150, value=50, step=10)
+        log_bins = st.toggle("Log-spaced Bins", value=False, help="Space bins evenly on a log scale to spread out the long tail of costs.")
 
     with c_hist1:
-        fig_hist = get_cost_hist_fig(filtered_df, dist_type, bin_count, use_log)
+        fig_hist = get_cost_hist_fig(version, token, dist_type, bin_count, use_log, log_bins)
         if fig_hist: st.plotly_chart(fig_hist, width='stretch')
         else: st.info("No data available.")
 
     # 3. PROJECT TYPES
     st.markdown('<div class="section-title">Project Types</div>', unsafe_allow_html=True)
-    if not filtered_df.empty:
+    if len(filtered_rows):
         with st.container(border=True, key="chart_container"):
             type_chart_style = st.radio("Chart Style", ["Bar Chart", "Pie Chart"], horizontal=True)
 
-        fig_tow = get_project_type_fig(filtered_df, type_chart_style)
+        fig_tow = get_project_type_fig(version, token, type_chart_style)
         if fig_tow:
             with st.container(border=True):
                 st.plotly_chart(fig_tow, width='stretch')
@@ -81,7 +82,7 @@ else:
 
     # 4. CONTRACTOR MARKET SHARE
     st.markdown('<div class="section-title">Contractor Participation</div>', unsafe_allow_html=True)
-    fig_val, fig_vol = get_contractor_figs(filtered_df)
+    fig_val, fig_vol = get_contractor_figs(version, token)
     with st.container(border=True):
         if fig_val: st.plotly_chart(fig_val, width='stretch')
         else: st.info("No contractor data available.")
@@ -100,7 +101,7 @@ else:
         'BudgetVariance',
         'RiskScore'
     ]
-    st.dataframe(filtered_df[desc_cols].describe().round(2),width='stretch')
+    st.dataframe(get_describe(version, token, tuple(desc_cols)).round(2),width='stretch')
 
 st.markdown(
     """
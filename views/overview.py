@@ -2,7 +2,8 @@ import pandas as pd
 import streamlit as st
 
 from data.mapping_dicts import column_interpretations
-from utils import load_data, prep_data, load_css
+from profiling import structure_table
+from utils import load_changes, load_profile, paged_table
 
 st.set_page_config(page_title="FloodGate", layout="centered")
 if 'df' in st.session_state:
@@ -11,12 +12,12 @@ else:
     st.error("Data not initialized. Please run the app from main.")
     st.stop()
 
-cols_to_clean = ['ContractCost', 'ApprovedBudgetForContract']
-for col in cols_to_clean:
-    if col in df.columns:
-        if df[col].dtype == 'object':
-            df[col] = df[col].astype(str).str.replace(',', '', regex=True)
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+profile = load_profile(df.attrs.get('version'))
+if profile is None:
+    st.warning("This dataset has been replaced by a newer extract. Reload the app to see it.")
+    st.stop()
+profile = profile['raw']
+budget = profile['columns']['ApprovedBudgetForContract']['parsed']
 
 st.markdown("""
     <div class="main-header">
@@ -39,9 +40,9 @@ with col1:
         </p>""", unsafe_allow_html=True)
 
 with col2:
-    col2.metric("Total Projects", len(df), border=True)
-    col2.metric("Average Approved Budget", f"₱{df['ApprovedBudgetForContract'].mean():,.0f}", border=True)
-    col2.metric("Total Approved Budget", f"₱{df['ApprovedBudgetForContract'].sum():,.0f}", border=True)
+    col2.metric("Total Projects", profile['rows'], border=True)
+    col2.metric("Average Approved Budget", f"₱{budget['mean']:,.0f}", border=True)
+    col2.metric("Total Approved Budget", f"₱{budget['sum']:,.0f}", border=True)
 
 st.markdown("""
     <div>
@@ -104,15 +105,21 @@ col_df = pd.DataFrame({
 st.dataframe(col_df, width='stretch')
 
 st.info("Dataset Structure")
-structure_df = pd.DataFrame({
-    "Column": df.columns,
-    "Non-Null Count": df.notnull().sum(),
-    "Data Type": df.dtypes.astype(str)
-})
-st.dataframe(structure_df, width='stretch')
+st.dataframe(structure_table(profile), width='stretch')
+
+changes = load_changes(df.attrs.get('version'))
+if changes is not None:
+    st.info("Changes Since the Previous Snapshot")
+    counts = changes['Change'].value_counts()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Added", int(counts.get('added', 0)), border=True)
+    c2.metric("Changed", int(counts.get('changed', 0)), border=True)
+    c3.metric("Removed", int(counts.get('removed', 0)), border=True)
+    with st.expander("View Changed Projects"):
+        st.dataframe(changes, width='stretch', hide_index=True)
 
 st.info("Raw Dataset Preview")
-st.dataframe(df, width='stretch')
+paged_table(df, "raw", source="raw")
 st.markdown(
     """
     <div style="
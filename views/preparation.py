@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from utils import load_css, load_data, prep_data
+from utils import load_profile, paged_table, DATE_COLUMN_CONFIG
 
 st.set_page_config(layout="centered", page_title="Preparation")
 if 'df' in st.session_state:
@@ -10,7 +10,11 @@ else:
     st.stop()
 
 st.markdown('<div class="title-card">Preparing the dataset</div>', unsafe_allow_html=True)
-original_row_count = len(df)
+profile = load_profile(df.attrs.get('version'))
+if profile is None:
+    st.warning("This dataset has been replaced by a newer extract. Reload the app to see it.")
+    st.stop()
+original_row_count = profile['raw']['rows']
 st.markdown("""
 <div>
     <p>
@@ -21,7 +25,7 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 st.markdown('<div class="section-title">Data Cleaning</div>', unsafe_allow_html=True)
-null_counts = df.isnull().sum()
+null_counts = pd.Series({col: column['nulls'] for col, column in profile['raw']['columns'].items()})
 null_display = null_counts[null_counts > 0].rename("Null Count").to_frame()
 extra_rows = pd.DataFrame({
     "Null Count": {
@@ -37,7 +41,7 @@ We preserved rows with incomplete municipal details since other columns still pr
   financial information, as these are required for the analysis.
 """)
 
-df_clean = prep_data(df)
+df_clean = st.session_state['clean_df']
 rows_removed_total = original_row_count - len(df_clean)
 
 st.markdown('<div class="section-title">Feature Engineering</div>', unsafe_allow_html=True)
@@ -125,7 +129,7 @@ st.dataframe(
 )
 
 st.info("Final Dataset Preview")
-st.dataframe(df_clean, width='stretch')
+paged_table(df_clean, "final", column_config=DATE_COLUMN_CONFIG)
 
 st.markdown(
     """